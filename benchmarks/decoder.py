@@ -0,0 +1,125 @@
+"""
+对比 schema 编译解码器与原先逐条 lambda 映射的解码耗时。
+
+    python -m benchmarks.decoder [次数]
+"""
+import sys
+import logging
+import timeit
+import utils.constants as const
+from processors.frame_decoder import get_decoder
+
+INF_FRAME = {
+    "code": "FFFF",
+    "enl": [
+        {"id": "operationMode", "data": "3"},
+        {"id": "roomTempControl", "data": "14"},
+        {"id": "heatingOutWaterTempControl", "data": "2D"},
+        {"id": "burningState", "data": "32"},
+        {"id": "hotWaterTempSetting", "data": "2A"},
+        {"id": "heatingTempSettingNM", "data": "3C"},
+        {"id": "heatingTempSettingHES", "data": "37"},
+        {"id": "errorCode", "data": "00"}
+    ]
+}
+
+STG_FRAME = {
+    "ptn": "J05",
+    "egy": [
+        {
+            "gasConsumption": "0001E240",
+            "totalPowerSupplyTime": "1A2B",
+            "actualUseTime": "0F10",
+            "totalHeatingBurningTime": "0A00",
+            "heatingBurningTimes": "0123",
+            "hotWaterBurningTimes": "0456"
+        }
+    ]
+}
+
+
+class LegacyDecoder:
+    """原先 MessageProcessor 中的解码实现，仅作基准对照"""
+
+    def __init__(self):
+        self.device_data = {"state": {}, "gas": {}, "supplyTime": {}}
+
+    def _process_hex_value(self, value, param_name):
+        try:
+            return str(int(value, 16))
+        except ValueError as e:
+            logging.warning(f"Invalid hex value for {param_name}: {value}")
+            raise ValueError(
+                f"Invalid hex value for {param_name}: {value}") from e
+
+    def _get_operation_mode(self, mode_code):
+        return const.OPERATION_MODES.get(mode_code, f"invalid ({mode_code})")
+
+    def _get_burning_state(self, state_code):
+        return const.BURNING_STATES.get(state_code, f"invalid ({state_code})")
+
+    def process_device_info(self, parsed_data):
+        state_mapping = {
+            'operationMode': self._get_operation_mode,
+            'roomTempControl': lambda x: self._process_hex_value(x, 'roomTempControl'),
+            'heatingOutWaterTempControl': lambda x: self._process_hex_value(x, 'heatingOutWaterTempControl'),
+            'burningState': self._get_burning_state,
+            'hotWaterTempSetting': lambda x: self._process_hex_value(x, 'hotWaterTempSetting'),
+            'heatingTempSettingNM': lambda x: self._process_hex_value(x, 'heatingTempSettingNM'),
+            'heatingTempSettingHES': lambda x: self._process_hex_value(x, 'heatingTempSettingHES')
+        }
+        for param in parsed_data.get('enl', []):
+            try:
+                param_id = param.get('id')
+                param_data = param.get('data')
+                if not param_id or not param_data:
+                    continue
+                if param_id in state_mapping:
+                    self.device_data["state"][param_id] = state_mapping[param_id](param_data)
+            except Exception as e:
+                logging.error(f"Error processing parameter {param_id}: {e}")
+
+    def process_energy_data(self, parsed_data):
+        for param in parsed_data.get('egy', []):
+            if not isinstance(param, dict):
+                continue
+            if gas_value := param.get('gasConsumption'):
+                try:
+                    self.device_data["gas"]["gasConsumption"] = self._process_hex_value(
+                        gas_value, 'gasConsumption')
+                except ValueError:
+                    continue
+            for key in param.keys() & const.TIME_PARAMETERS:
+                try:
+                    self.device_data["supplyTime"][key] = self._process_hex_value(param[key], key)
+                except ValueError:
+                    continue
+
+
+def run(number=100000):
+    legacy = LegacyDecoder()
+    decoder = get_decoder("0F06000C")
+    device_data = {"state": {}, "gas": {}, "supplyTime": {}}
+
+    legacy.process_device_info(INF_FRAME)
+    legacy.process_energy_data(STG_FRAME)
+    decoder.decode_info(INF_FRAME, device_data)
+    decoder.decode_energy(STG_FRAME, device_data)
+    assert device_data == legacy.device_data, "decoders disagree"
+
+    cases = [
+        ("inf", lambda: legacy.process_device_info(INF_FRAME),
+         lambda: decoder.decode_info(INF_FRAME, device_data)),
+        ("stg", lambda: legacy.process_energy_data(STG_FRAME),
+         lambda: decoder.decode_energy(STG_FRAME, device_data))
+    ]
+    for name, legacy_fn, compiled_fn in cases:
+        legacy_time = min(timeit.repeat(legacy_fn, number=number, repeat=3))
+        compiled_time = min(timeit.repeat(compiled_fn, number=number, repeat=3))
+        print(f"{name}: legacy {legacy_time / number * 1e6:.2f} us/frame, "
+              f"compiled {compiled_time / number * 1e6:.2f} us/frame, "
+              f"speedup {legacy_time / compiled_time:.2f}x")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
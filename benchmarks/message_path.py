@@ -0,0 +1,249 @@
+"""
+离线基准：inf/stg 帧经 MessageProcessor.process_message 进入 LocalClient.update，
+本地发布由只计数的假 paho 客户端接收，不需要网络。
+
+    python -m benchmarks.message_path                       # 合成帧，与基线比较
+    python -m benchmarks.message_path --frames frames.jsonl # 使用记录的帧
+    python -m benchmarks.message_path --check-timing        # 同一台机器上也检查耗时
+    python -m benchmarks.message_path --save-baseline       # 更新基线
+
+--frames 可以是 RINNAI_CAPTURE_DIR 记录的帧文件，也可以是每行一个
+{"topic": ..., "payload": ...} 的 JSON lines 文件。
+默认只有内存分配指标变差时返回非零；耗时与机器相关，只打印，
+在生成基线的机器上可以用 --check-timing 一并检查。
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import tracemalloc
+from config import Config
+from clients.local_client import LocalClient
+from processors.message_processor import MessageProcessor
+from processors.history_store import HistoryStore
+from utils.frame_log import is_frame_log, read_frames
+from utils import log
+from .decoder import INF_FRAME, STG_FRAME
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEVICE_TYPE = "0F06000C"
+INF_TOPIC = "rinnai/SR/01/SR/bench/inf/"
+STG_TOPIC = "rinnai/SR/01/SR/bench/stg/"
+# 越大越好的指标，其余越小越好
+HIGHER_IS_BETTER = {"messages_per_sec"}
+# 与机器相关的耗时指标，只在 --check-timing 时判断回退
+TIMING = {"messages_per_sec", "p50_us", "p99_us"}
+# 与机器无关、默认判断回退的指标
+GATED = {"peak_alloc_bytes_per_frame", "retained_bytes_per_frame"}
+
+
+class FakeMessage:
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+
+class FakePahoClient:
+    """只统计发布次数和字节数的 paho 客户端替身"""
+
+    def __init__(self):
+        self.publishes = 0
+        self.bytes = 0
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self.publishes += 1
+        self.bytes += len(payload or b"")
+
+    def subscribe(self, topics):
+        return 0, 0
+
+    def loop_start(self):
+        pass
+
+    def loop_stop(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.client = FakePahoClient()
+
+    def attach(self, device_client):
+        pass
+
+
+class FakeRinnaiClient:
+    """LocalClient 只用到 processor 和这几个属性"""
+
+    def __init__(self, message_processor):
+        self.message_processor = message_processor
+
+
+def synthetic_frames(count, seed=1):
+    """交替生成 inf/stg 帧，参数随机变化以覆盖有变化和无变化两种发布路径"""
+    rng = random.Random(seed)
+    gas = 0x1E240
+    frames = []
+    for i in range(count):
+        if i % 4 == 3:
+            gas += rng.choice((0, 0, 12, 40))
+            egy = dict(STG_FRAME["egy"][0], gasConsumption=f"{gas:08X}")
+            frames.append(FakeMessage(STG_TOPIC, json.dumps(dict(STG_FRAME, egy=[egy])).encode()))
+        else:
+            enl = [dict(param) for param in INF_FRAME["enl"]]
+            for param in enl:
+                if param["id"] == "burningState":
+                    param["data"] = rng.choice(("30", "31", "32"))
+                elif param["id"] == "hotWaterTempSetting" and rng.random() < 0.2:
+                    param["data"] = f"{rng.randint(35, 60):02X}"
+            frames.append(FakeMessage(INF_TOPIC, json.dumps(dict(INF_FRAME, enl=enl)).encode()))
+    return frames
+
+
+def recorded_frames(path):
+    if is_frame_log(path):
+        return [FakeMessage(topic, payload) for _, topic, payload in read_frames(path)]
+    frames = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                payload = record["payload"]
+                if not isinstance(payload, str):
+                    payload = json.dumps(payload)
+                frames.append(FakeMessage(record["topic"], payload.encode()))
+    return frames
+
+
+def build_pipeline():
+    """与 DeviceBridge 相同的观察者链路，磁盘快照除外"""
+    processor = MessageProcessor(DEVICE_TYPE)
+    if Config.HISTORY_ENABLED:
+        processor.register_observer(HistoryStore(Config.HISTORY_SIZES))
+    connection = FakeConnection()
+    LocalClient(Config, FakeRinnaiClient(processor), connection)
+    return processor, connection.client
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure_latency(frames, rounds):
+    processor, client = build_pipeline()
+    # 预热，避免首帧的初始化计入
+    for msg in frames[:100]:
+        processor.process_message(msg)
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for msg in frames:
+            start = time.perf_counter_ns()
+            processor.process_message(msg)
+            latencies.append(time.perf_counter_ns() - start)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    total = len(latencies)
+    return {
+        "messages_per_sec": total / elapsed,
+        "p50_us": percentile(latencies, 0.50) / 1000,
+        "p99_us": percentile(latencies, 0.99) / 1000,
+        "publishes_per_frame": client.publishes / (total + min(100, len(frames))),
+    }
+
+
+def measure_allocations(frames):
+    """每帧的峰值临时分配和保留下来的字节数"""
+    processor, _ = build_pipeline()
+    for msg in frames[:100]:
+        processor.process_message(msg)
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        peak_total = 0
+        for msg in frames:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            processor.process_message(msg)
+            peak_total += tracemalloc.get_traced_memory()[1] - before
+        retained = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+    return {
+        "peak_alloc_bytes_per_frame": peak_total / len(frames),
+        "retained_bytes_per_frame": retained / len(frames),
+    }
+
+
+def compare(results, baseline, tolerance, check_timing=False):
+    """打印与基线的差异，返回是否有需要检查的指标变差超过 tolerance"""
+    gated = GATED | TIMING if check_timing else GATED
+    regressed = False
+    for name, value in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            print(f"  {name:<28} {value:12.2f}")
+            continue
+        change = (value - reference) / reference
+        worse = -change if name in HIGHER_IS_BETTER else change
+        flag = ""
+        if worse > tolerance:
+            if name in gated:
+                flag = "  REGRESSION"
+                regressed = True
+            elif name in TIMING:
+                flag = "  (timing, not checked)"
+        print(f"  {name:<28} {value:12.2f}  baseline {reference:12.2f}  {change * 100:+7.1f}%{flag}")
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", help="recorded frames (JSON lines)")
+    parser.add_argument("--count", type=int, default=2000, help="synthetic frame count")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="allowed relative regression before failing (default 0.10)")
+    parser.add_argument("--check-timing", action="store_true",
+                        help="also fail on timing regressions (only meaningful on the baseline machine)")
+    parser.add_argument("--logging", action="store_true",
+                        help="keep INFO logs on, routed through utils.log to /dev/null")
+    args = parser.parse_args(argv)
+
+    if args.logging:
+        # 测量日志本身的开销：与运行时相同的队列、采样和限速，输出丢弃
+        log.setup(Config, stream=open(os.devnull, "w"))
+    else:
+        # 发布路径的 INFO 日志会主导耗时，基准中关闭
+        logging.disable(logging.INFO)
+    frames = recorded_frames(args.frames) if args.frames else synthetic_frames(args.count)
+    print(f"{len(frames)} frames x {args.rounds} rounds "
+          f"({'recorded' if args.frames else 'synthetic'})")
+
+    results = measure_latency(frames, args.rounds)
+    results.update(measure_allocations(frames))
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        for name, value in results.items():
+            print(f"  {name:<28} {value:12.2f}")
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    return 1 if compare(results, baseline, args.tolerance, args.check_timing) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import paho.mqtt.client as mqtt
+
+
+class AsyncioMQTTHelper:
+    """
+    通过 paho 的外部 socket 回调，把 MQTT 客户端挂到 asyncio 事件循环上，
+    不再需要 loop_start/loop_forever 线程。
+    建立连接(DNS、TCP、TLS 握手)是阻塞的，connect/重连放到执行器中，
+    期间 paho 在执行器线程中调用的 socket 回调转回事件循环执行。
+    """
+
+    RECONNECT_MIN_DELAY = 1
+    RECONNECT_MAX_DELAY = 120
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, client: mqtt.Client, should_reconnect=None):
+        self.loop = loop
+        self.client = client
+        # 返回 False 时断线后不自动重连，例如按需连接已没有租约
+        self.should_reconnect = should_reconnect
+        self.misc_task = None
+        self.reconnect_handle = None
+        self.reconnect_delay = self.RECONNECT_MIN_DELAY
+        self.client.on_socket_open = self._in_loop(self.on_socket_open)
+        self.client.on_socket_close = self._in_loop(self.on_socket_close)
+        self.client.on_socket_register_write = self._in_loop(self.on_socket_register_write)
+        self.client.on_socket_unregister_write = self._in_loop(self.on_socket_unregister_write)
+        # 保留客户端自己的断开回调
+        self.client_on_disconnect = self.client.on_disconnect
+        self.client.on_disconnect = self.on_disconnect
+
+    def _in_loop(self, callback):
+        def wrapper(client, userdata, sock):
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is self.loop:
+                callback(client, userdata, sock)
+            elif self.loop.is_closed():
+                # 事件循环结束后客户端被回收时关闭 socket，已没有需要注销的读写回调
+                return
+            else:
+                self.loop.call_soon_threadsafe(callback, client, userdata, sock)
+        return wrapper
+
+    def on_socket_open(self, client, userdata, sock):
+        if sock.fileno() == -1:
+            # 连接在转回事件循环之前已经失败并关闭
+            return
+        self.loop.add_reader(sock, self._on_readable)
+        self.reconnect_delay = self.RECONNECT_MIN_DELAY
+        if self.misc_task is None or self.misc_task.done():
+            self.misc_task = self.loop.create_task(self.misc_loop())
+
+    def on_socket_close(self, client, userdata, sock):
+        if sock.fileno() == -1:
+            return
+        self.loop.remove_reader(sock)
+        self.loop.remove_writer(sock)
+
+    def on_socket_register_write(self, client, userdata, sock):
+        if sock.fileno() == -1:
+            return
+        self.loop.add_writer(sock, self.client.loop_write)
+
+    def on_socket_unregister_write(self, client, userdata, sock):
+        if sock.fileno() == -1:
+            return
+        self.loop.remove_writer(sock)
+
+    def _on_readable(self):
+        self.client.loop_read()
+        # TLS 会在 ssl 对象里缓存已解密的数据，socket 不会再次变为可读
+        sock = self.client.socket()
+        while sock is not None and getattr(sock, "pending", None) and sock.pending():
+            self.client.loop_read()
+            sock = self.client.socket()
+
+    async def misc_loop(self):
+        """keepalive 和重发等周期性工作"""
+        try:
+            while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+                await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            pass
+
+    def on_disconnect(self, client, userdata, rc):
+        if self.client_on_disconnect:
+            self.client_on_disconnect(client, userdata, rc)
+        # rc 为 0 表示主动断开，不需要重连
+        if rc == 0:
+            return
+        if not self._wants_connection():
+            logging.info(f"MQTT connection lost (rc={rc}), not reconnecting")
+            return
+        logging.warning(f"MQTT connection lost (rc={rc}), reconnecting in {self.reconnect_delay}s")
+        self._schedule_reconnect()
+
+    def _wants_connection(self) -> bool:
+        return self.should_reconnect is None or self.should_reconnect()
+
+    def connect(self, host: str, port: int, keepalive: int = 60) -> None:
+        """不阻塞事件循环地建立连接，失败时按退避重试"""
+        self.cancel_reconnect()
+        self.client.connect_async(host, port, keepalive)
+        self.loop.create_task(self._reconnect_async())
+
+    def _schedule_reconnect(self):
+        self.cancel_reconnect()
+        self.reconnect_handle = self.loop.call_later(self.reconnect_delay, self._reconnect)
+        self.reconnect_delay = min(self.reconnect_delay * 2, self.RECONNECT_MAX_DELAY)
+
+    def _reconnect(self):
+        self.reconnect_handle = None
+        self.loop.create_task(self._reconnect_async())
+
+    async def _reconnect_async(self):
+        if not self._wants_connection():
+            return
+        try:
+            await self.loop.run_in_executor(None, self.client.reconnect)
+        except OSError as e:
+            logging.warning(f"MQTT reconnect failed: {e}, retrying in {self.reconnect_delay}s")
+            if self._wants_connection():
+                self._schedule_reconnect()
+
+    def cancel_reconnect(self):
+        if self.reconnect_handle:
+            self.reconnect_handle.cancel()
+            self.reconnect_handle = None
+
+    def close(self):
+        self.cancel_reconnect()
+        if self.misc_task:
+            self.misc_task.cancel()
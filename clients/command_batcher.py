@@ -0,0 +1,47 @@
+import logging
+import threading
+
+
+class CommandBatcher:
+    """
+    在一个短时间窗口内合并设置命令：同一参数只保留最后一个值，
+    窗口结束时把所有待发参数打包成一条 J00 帧发送。
+    """
+
+    def __init__(self, rinnai_client, window: float):
+        self.rinnai_client = rinnai_client
+        self.window = window
+        self.pending = {}
+        self.timer = None
+        self.lock = threading.Lock()
+
+    def submit(self, param_id: str, data: str) -> None:
+        if self.window <= 0:
+            self.rinnai_client.publish_params({param_id: data})
+            return
+        with self.lock:
+            if param_id in self.pending:
+                logging.debug("Coalesced pending %s: %s -> %s", param_id, self.pending[param_id], data)
+            self.pending[param_id] = data
+            if self.timer is None:
+                self.timer = self.rinnai_client.scheduler.call_later(self.window, self.flush)
+
+    def flush(self) -> None:
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            if self.timer:
+                self.timer.cancel()
+                self.timer = None
+        if pending:
+            self.rinnai_client.publish_params(pending)
+
+    def send_now(self, params: dict) -> None:
+        """立即发送，窗口内尚未发送的命令一并打包"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            if self.timer:
+                self.timer.cancel()
+                self.timer = None
+        pending.update(params)
+        if pending:
+            self.rinnai_client.publish_params(pending)
@@ -0,0 +1,212 @@
+import time
+import logging
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+import utils.constants as const
+from utils import entities, metrics
+
+# operationMode 代码中各模式开关对应的位，例如 4B = 快速采暖(0x40) | 节能(0x08) | 采暖(0x03)
+MODE_BITS = {name: switch["bit"] for name, switch in entities.SWITCHES.items() if "bit" in switch}
+MODE_CODES = {name: code for code, name in const.OPERATION_MODES.items()}
+
+
+def toggled_operation_mode(operation_mode: Optional[str], switches: Iterable[str]) -> Optional[str]:
+    """依次切换 switches 后预期的 operationMode 名称，无法推算时返回 None"""
+    mode = operation_mode
+    for switch in switches:
+        code = MODE_CODES.get(mode)
+        if code is None:
+            return None
+        value = int(code, 16)
+        # 采暖是否开启与界面上的采暖开关一致，休眠(2)虽然带 0x02 位也算关闭
+        heating = entities.switch_status("summerWinter", mode)
+        if switch == "summerWinter":
+            value = 0x01 if heating else 0x03
+        elif switch in MODE_BITS and heating:
+            value ^= MODE_BITS[switch]
+        else:
+            return None
+        mode = const.OPERATION_MODES.get(f"{value:X}")
+    return mode
+
+
+def expected_switches(operation_mode: Optional[str], switches: Tuple[str, ...]) -> Dict[str, bool]:
+    """依次切换 switches 后各开关的目标状态；模式无法推算时按切换次数的奇偶判断"""
+    expected_mode = toggled_operation_mode(operation_mode, switches)
+    if expected_mode is not None:
+        return {switch: entities.switch_status(switch, expected_mode) for switch in switches}
+    expected = {}
+    for switch in switches:
+        expected[switch] = not expected.get(switch, entities.switch_status(switch, operation_mode))
+    return expected
+
+
+class PendingCommand:
+    """
+    等待确认的命令。温度参数每个参数一个；模式开关都作用于 operationMode，
+    同一时间只跟踪一个 param_id 为 operationMode 的命令，switches 是合并后依次切换的开关。
+    """
+
+    def __init__(self, param_id: str, data: str, reported: Optional[str], switches: Tuple[str, ...] = ()):
+        self.param_id = param_id
+        self.data = data
+        # 设备最近一次上报的值，超时回滚到该值
+        self.reported = reported
+        self.switches = switches
+        # 模式开关的目标状态，温度参数为空
+        self.expected_on = expected_switches(reported, switches) if switches else {}
+        self.sent_at = time.monotonic()
+        self.attempts = 1
+        self.timer = None
+
+    @property
+    def label(self) -> str:
+        return "+".join(self.switches) if self.switches else self.param_id
+
+    def optimistic_value(self) -> Optional[str]:
+        if not self.switches:
+            return str(int(self.data, 16))
+        return toggled_operation_mode(self.reported, self.switches)
+
+    def confirmed_by(self, value: Optional[str]) -> bool:
+        if not self.switches:
+            return value == str(int(self.data, 16))
+        return all(entities.switch_status(switch, value) == on for switch, on in self.expected_on.items())
+
+
+class CommandTracker:
+    """
+    乐观更新和命令确认。下发命令后立即把预期值写入 state 并发布，
+    按参数跟踪等待确认，收到 inf 帧中的上报值后确认；超时后温度参数重发，
+    重试用完或模式开关(J00 的 "31" 是切换，重发可能切回去)直接回滚到设备上报的值。
+    """
+
+    def __init__(self, rinnai_client, timeout: float, retries: int, optimistic: bool = True):
+        self.rinnai_client = rinnai_client
+        self.message_processor = rinnai_client.message_processor
+        self.timeout = timeout
+        self.retries = retries
+        self.optimistic = optimistic
+        self.pending: Dict[str, PendingCommand] = {}
+        self.lock = threading.Lock()
+        self.message_processor.command_tracker = self
+
+    def _state(self):
+        """当前快照中的 state，只读"""
+        return self.message_processor.device_data["state"]
+
+    def _write_state(self, changes: Dict[str, str]) -> None:
+        if changes:
+            self.message_processor.update_state(lambda working: working["state"].update(changes))
+
+    def apply_optimistic(self, params: Dict[str, str]) -> None:
+        """
+        窗口合并期间也先发布预期值，并立即登记等待确认，
+        命令发出前到达的 inf 帧不会把预期值改回去；发出时 track() 重新计时
+        """
+        if not self.optimistic:
+            return
+        self.track({param_id: data for param_id, data in params.items() if param_id not in entities.SWITCHES})
+
+    def track(self, params: Dict[str, str]) -> None:
+        """命令已发出，开始等待确认"""
+        state = self._state()
+        changes = {}
+        with self.lock:
+            switches = ()
+            for param_id, data in params.items():
+                if param_id in entities.SWITCHES:
+                    switches += (param_id,)
+                    continue
+                previous = self._pop(param_id)
+                reported = previous.reported if previous else state.get(param_id)
+                self._start(PendingCommand(param_id, data, reported), state, changes)
+            if switches:
+                # 场景一次切换多个开关时合并成一个 operationMode 预期，
+                # 上一个模式命令尚未确认时在它的基础上继续切换
+                previous = self._pop("operationMode")
+                if previous is not None:
+                    reported = previous.reported
+                    switches = previous.switches + switches
+                else:
+                    reported = state.get("operationMode")
+                self._start(PendingCommand("operationMode", "31", reported, switches), state, changes)
+        self._write_state(changes)
+
+    def _pop(self, param_id: str) -> Optional[PendingCommand]:
+        previous = self.pending.pop(param_id, None)
+        if previous is not None:
+            self._cancel(previous)
+        return previous
+
+    def _start(self, command: PendingCommand, state, changes: Dict[str, str]) -> None:
+        self.pending[command.param_id] = command
+        self._arm(command)
+        optimistic = command.optimistic_value() if self.optimistic else None
+        if optimistic is not None and state.get(command.param_id) != optimistic:
+            changes[command.param_id] = optimistic
+
+    def _arm(self, command: PendingCommand) -> None:
+        command.timer = self.rinnai_client.scheduler.call_later(
+            self.timeout, self._on_timeout, command)
+
+    @staticmethod
+    def _cancel(command: PendingCommand) -> None:
+        if command.timer:
+            command.timer.cancel()
+            command.timer = None
+
+    def reconcile(self, parsed_data: Dict[str, Any], state: Dict[str, Any]) -> None:
+        """
+        inf 帧解码之后、新版本状态生成之前调用，state 是可修改的副本。
+        帧中上报了的参数用于确认，尚未确认的参数把乐观值重新写回 state，避免界面在确认前跳回旧值。
+        """
+        reported_ids = {param.get('id') for param in parsed_data.get('enl', [])}
+        with self.lock:
+            for param_id, command in list(self.pending.items()):
+                if param_id not in reported_ids:
+                    continue
+                value = state.get(param_id)
+                if command.confirmed_by(value):
+                    self._cancel(command)
+                    del self.pending[param_id]
+                    latency = time.monotonic() - command.sent_at
+                    if metrics.ENABLED:
+                        metrics.COMMAND_ACK_SECONDS.observe(latency, command.label)
+                    logging.info(f"Command {command.label}={command.data} acknowledged after {latency:.3f}s "
+                                 f"(attempt {command.attempts})")
+                    continue
+                command.reported = value
+                optimistic = command.optimistic_value() if self.optimistic else None
+                if optimistic is not None:
+                    state[param_id] = optimistic
+
+    def _on_timeout(self, command: PendingCommand) -> None:
+        with self.lock:
+            if self.pending.get(command.param_id) is not command:
+                return
+            command.timer = None
+            if not command.switches and command.attempts <= self.retries:
+                command.attempts += 1
+                self._arm(command)
+                retry = True
+            else:
+                del self.pending[command.param_id]
+                retry = False
+        if retry:
+            logging.warning(f"Command {command.param_id}={command.data} not acknowledged "
+                            f"after {self.timeout}s, retrying (attempt {command.attempts})")
+            self.rinnai_client.publish_params({command.param_id: command.data}, track=False)
+            return
+        logging.warning(f"Command {command.label}={command.data} not acknowledged, "
+                        f"rolling back to {command.reported}")
+        if metrics.ENABLED:
+            metrics.COMMAND_TIMEOUTS.inc(command.label)
+        if command.reported is not None:
+            self._write_state({command.param_id: command.reported})
+
+    def close(self) -> None:
+        with self.lock:
+            for command in self.pending.values():
+                self._cancel(command)
+            self.pending.clear()
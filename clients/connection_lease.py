@@ -0,0 +1,134 @@
+import logging
+import threading
+
+
+class ConnectionLeaseManager:
+    """
+    Rinnai 云端连接的租约管理。
+    第一个租约建立连接，等到所有主题订阅完成后才执行等待中的操作；
+    之后的租约复用连接；最后一个租约释放后空闲 idle_timeout 秒自动断开。
+    """
+
+    def __init__(self, rinnai_client, idle_timeout: float):
+        self.rinnai_client = rinnai_client
+        self.idle_timeout = idle_timeout
+        self.leases = 0
+        self.ready = False
+        self.waiting = []
+        # hold_for 持有的租约，连接被拒绝时一并释放
+        self.holds = []
+        self.idle_timer = None
+        self.lock = threading.RLock()
+
+    def acquire(self, on_ready=None) -> None:
+        """获取租约，连接就绪后调用 on_ready(已就绪时立即调用)"""
+        with self.lock:
+            self.leases += 1
+            self._cancel_idle_timer()
+            run_now = self.ready
+            if not run_now and on_ready:
+                self.waiting.append(on_ready)
+            need_connect = not self.rinnai_client.connected
+
+        if need_connect:
+            try:
+                self.rinnai_client.open_connection()
+            except Exception:
+                with self.lock:
+                    self.leases -= 1
+                    if on_ready in self.waiting:
+                        self.waiting.remove(on_ready)
+                raise
+        if run_now and on_ready:
+            on_ready()
+
+    def release(self) -> None:
+        with self.lock:
+            self.leases = max(0, self.leases - 1)
+            if self.leases == 0 and self.rinnai_client.connected:
+                self._cancel_idle_timer()
+                self.idle_timer = self.rinnai_client.scheduler.call_later(
+                    self.idle_timeout, self._close_if_idle)
+
+    def run(self, action) -> None:
+        """在租约内执行 action：连接就绪后执行，执行完立即释放租约"""
+        def run_and_release():
+            try:
+                action()
+            finally:
+                self.release()
+        self.acquire(run_and_release)
+
+    def hold_for(self, duration: float) -> None:
+        """持有租约 duration 秒，用于连接后等待设备推送更新"""
+        self.acquire()
+        with self.lock:
+            hold = self.rinnai_client.scheduler.call_later(duration, lambda: self._release_hold(hold))
+            self.holds.append(hold)
+
+    def _release_hold(self, hold) -> None:
+        with self.lock:
+            if hold not in self.holds:
+                # 已在连接被拒绝时释放
+                return
+            self.holds.remove(hold)
+        self.release()
+
+    def on_ready(self) -> None:
+        """连接建立且订阅完成"""
+        with self.lock:
+            self.ready = True
+            waiting, self.waiting = self.waiting, []
+        for callback in waiting:
+            try:
+                callback()
+            except Exception as e:
+                logging.error(f"Rinnai leased action failed: {e}")
+
+    def on_connect_failed(self, rc) -> None:
+        """
+        连接被拒绝时丢弃等待中的操作和 hold_for 租约，避免无限堆积；
+        没有其他租约时断开连接，否则 paho 会一直重连
+        """
+        with self.lock:
+            waiting, self.waiting = self.waiting, []
+            holds, self.holds = self.holds, []
+            self.leases = max(0, self.leases - len(waiting) - len(holds))
+            unused = self.leases == 0
+            if unused:
+                # 不在 paho 回调中直接断开，交给调度器执行
+                self._cancel_idle_timer()
+                self.idle_timer = self.rinnai_client.scheduler.call_later(0, self._close_if_idle)
+        for hold in holds:
+            hold.cancel()
+        if waiting or holds:
+            logging.warning(f"Rinnai connection refused (rc={rc}), dropped {len(waiting)} pending action(s) "
+                            f"and {len(holds)} hold(s)")
+
+    def on_disconnected(self) -> None:
+        """连接断开后需要重新订阅，清掉上次连接遗留的订阅确认"""
+        with self.lock:
+            self.ready = False
+            self.rinnai_client.pending_subscriptions.clear()
+
+    def _cancel_idle_timer(self) -> None:
+        if self.idle_timer:
+            self.idle_timer.cancel()
+            self.idle_timer = None
+
+    def _close_if_idle(self) -> None:
+        with self.lock:
+            self.idle_timer = None
+            if self.leases > 0:
+                return
+        logging.info("Rinnai connection has no active lease, disconnecting")
+        self.rinnai_client.close_connection()
+
+    def close(self) -> None:
+        with self.lock:
+            self._cancel_idle_timer()
+            self.leases = 0
+            self.waiting = []
+            holds, self.holds = self.holds, []
+        for hold in holds:
+            hold.cancel()
@@ -1,196 +1,161 @@
-import ssl
 import json
+import hashlib
 import logging
 from .mqtt_client import MQTTClientBase
+from utils import entities
+from utils.device_schemas import get_schema
 
 
 class RinnaiHomeAssistantDiscovery(MQTTClientBase):
-    def __init__(self,config):
-        super().__init__("rinnai_ha_discovery")
+    """
+    Home Assistant 自动发现。配置在初始化时生成一次并计算 hash，
+    通过共享的本地连接与 broker 上已保留的配置比较，只发布有变化的配置。
+    """
+
+    def __init__(self, config, connection):
+        super().__init__("rinnai_ha_discovery", client=connection.client)
         self.config = config
-        self.mqtt_host = self.config.LOCAL_MQTT_HOST
-        self.mqtt_port = self.config.LOCAL_MQTT_PORT
-        self.unique_id = "rinnai_heater"
+        self.unique_id = self.config.HA_UNIQUE_ID
+        self.node_id = self.config.HA_NODE_ID
         self.discovery_prefix = "homeassistant"
-        
-        if self.config.LOCAL_MQTT_TLS:
-            self.client.tls_set(
-                cert_reqs=ssl.CERT_NONE,
-                tls_version=ssl.PROTOCOL_TLSv1_2
-            )
-            self.client.tls_insecure_set(True)
-            logging.info("Local MQTT TLS enabled")
+        self.local_topics = self.config.get_local_topics()
+        self.discovery_configs = self.build_discovery_configs()
+        self.hashes = {topic: self.payload_hash(payload)
+                       for topic, payload in self.discovery_configs.items()}
+        # broker 上已保留且内容相同的配置
+        self.confirmed = set()
+        # 订阅后发送到探测主题的消息回到本地时，之前的保留消息都已收到
+        self.probe_topic = f"{self.config.LOCAL_TOPIC_PREFIX}/discovery/probe"
+        self.topics = {topic: topic for topic in self.discovery_configs}
+        self.topics["probe"] = self.probe_topic
+        connection.attach(self)
+
+    @staticmethod
+    def payload_hash(payload) -> str:
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        return hashlib.sha1(payload).hexdigest()
 
-        if self.config.LOCAL_MQTT_USERNAME and self.config.LOCAL_MQTT_PASSWORD:
-            self.client.username_pw_set(
-                self.config.LOCAL_MQTT_USERNAME, self.config.LOCAL_MQTT_PASSWORD)
-            logging.info("Local MQTT authentication enabled")
-        
-    
     def on_connect(self, client, userdata, flags, rc):
-        logger.info(f"HomeAssistant MQTT connect status: {rc}")
+        logging.info(f"HomeAssistant MQTT connect status: {rc}")
+        if rc != 0:
+            return
+        self.confirmed = set()
+        self.subscribe([(topic, 0) for topic in self.topics.values()])
+        self.publish(self.probe_topic, "")
 
     def on_message(self, client, userdata, msg):
-        pass
-    def generate_config(self, component_type, object_id, name, topic, config_type='sensor', unit=None):
+        if msg.topic == self.probe_topic:
+            self.client.unsubscribe(list(self.topics.values()))
+            self.publish_discovery_configs()
+            return
+        if msg.retain and self.hashes.get(msg.topic) == self.payload_hash(msg.payload):
+            self.confirmed.add(msg.topic)
+
+    def generate_config(self, entity):
         """
-        生成通用配置
+        根据实体定义生成发现配置，返回 (配置主题, payload)
         """
-        base_topic = f"{self.discovery_prefix}/{component_type}/rinnai_{object_id}"
+        kind = entity["kind"]
+        object_id = entity["object_id"]
+        base_topic = f"{self.discovery_prefix}/{kind}/{self.node_id}_{object_id}"
 
         config = {
-            "name": name,
+            "name": f"Rinnai {entity['label']}",
             "unique_id": f"{self.unique_id}_{object_id}",
-            "state_topic": self.config.get_local_topics().get("state"),
-            "value_template": f"{{{{ value_json.{object_id} }}}}",
+            "state_topic": self.local_topics.get(entity.get("state") or entity.get("section", "state")),
+            "value_template": self.get_value_template(entity),
             "device": {
                 "identifiers": [self.unique_id],
-                "name": "Rinnai Heater",
+                "name": self.config.HA_DEVICE_NAME,
                 "manufacturer": "Rinnai",
-                "model": "G56"
+                "model": get_schema(self.config.DEVICE_TYPE)["model"]
             }
         }
-        # 添加单位
-        if unit:
-            config["unit_of_measurement"] = unit
-
-        if config_type == 'sensor' and object_id == 'gasConsumption':
-            config.update({
-                "state_topic": self.config.get_local_topics().get("gas"),
-                "value_template": f"{{{{ (value_json.{object_id} | float) / 10000 }}}}",
-                "unit_of_measurement": "m³",
-                "device_class": "gas"
-            })
-        elif config_type == 'sensor' and 'supplyTime' in object_id:
-
-            config.update({
-                "state_topic": self.config.get_local_topics().get("supplyTime"),
-                "value_template": f"{{{{ value_json.{object_id.split('/')[-1]} }}}}",
-            })
-
-
-        if config_type == 'number' and object_id == 'hotWaterTempSetting':
+        command_topic = self.local_topics.get(entity["param"])
+
+        if kind == 'sensor':
+            if "unit" in entity:
+                config["unit_of_measurement"] = entity["unit"]
+            if "device_class" in entity:
+                config["device_class"] = entity["device_class"]
+        elif kind == 'number':
             config.update({
-                "command_topic": topic,
-                "min": 35,
-                "max": 60,
+                "command_topic": command_topic,
+                "min": entity["min"],
+                "max": entity["max"],
                 "step": 1,
-                "unit_of_measurement": "°C"
+                "unit_of_measurement": entity["unit"]
             })
-        elif config_type == 'number' and (object_id == 'heatingTempSettingNM' or object_id == 'heatingTempSettingHES'):
+        elif kind == 'switch':
             config.update({
-                "command_topic": topic,
-                "min": 45,
-                "max": 70,
-                "step": 1,
-                "unit_of_measurement": "°C"
+                "command_topic": command_topic,
+                "payload_on": "ON",
+                "payload_off": "OFF"
             })
-        elif config_type == 'switch':
+        elif kind == 'binary_sensor':
             config.update({
-                "state_topic": self.config.get_local_topics().get("state"),
-                "command_topic": topic,
                 "payload_on": "ON",
                 "payload_off": "OFF",
-                "value_template": self.get_switch_value_template(object_id)
+                "device_class": entity["device_class"]
+            })
+        elif kind == 'select':
+            config.update({
+                "command_topic": command_topic,
+                "options": list(self.config.get_presets())
             })
 
-        return f"{base_topic}/config", json.dumps(config)
+        if config["value_template"] is None:
+            # 场景状态、数据过期等主题直接是显示值，不需要模板
+            config.pop("value_template")
+        elif self.config.LOCAL_ATTRIBUTE_TOPICS:
+            # 属性主题上的值已在桥接端换算好，直接订阅该主题，不需要模板
+            config.pop("value_template")
+            config["state_topic"] = self.config.get_attribute_topic(entity["param"])
 
+        return f"{base_topic}/config", json.dumps(config)
 
-    def get_switch_value_template(self, object_id):
+    @staticmethod
+    def get_value_template(entity):
         """
-        根据 object_id 返回对应的 value_template，用于解析 switch 的状态
+        根据实体定义返回 value_template，开关由 operationMode 是否在模式集合中判断
         """
-        # 定义模式对应的 operationMode 值集合
-        mode_codes = {
-            "energySavingMode": ["采暖节能", "快速采暖/节能"],
-            "outdoorMode": ["采暖外出", "快速采暖/外出"],
-            "rapidHeating": ["快速采暖", "快速采暖/节能", "快速采暖/外出", "快速采暖/预约"],
-            "summerWinter": ["关机", "采暖关闭", "休眠"]
-        }
-
-        codes = mode_codes.get(object_id, [])
-        codes_string = ','.join(f"'{code}'" for code in codes)
-
-        # 对于summerWinter，当值在列表中时为OFF，其他情况为ON
-        if object_id == "summerWinter":
-            return f"{{% if value_json.operationMode in [{codes_string}] %}}OFF{{% else %}}ON{{% endif %}}"
-        # 对于其他开关，当值在列表中时为ON，其他情况为OFF
-        else:
-            return f"{{% if value_json.operationMode in [{codes_string}] %}}ON{{% else %}}OFF{{% endif %}}"
-
-
-
+        kind = entity["kind"]
+        param = entity["param"]
+        if kind in ('binary_sensor', 'select'):
+            return None
+        if kind == 'switch':
+            codes_string = ','.join(f"'{code}'" for code in entity["modes"])
+            # inverted 的开关(summerWinter)在集合中时为OFF，其他开关在集合中时为ON
+            on, off = ("OFF", "ON") if entity["inverted"] else ("ON", "OFF")
+            return f"{{% if value_json.operationMode in [{codes_string}] %}}{on}{{% else %}}{off}{{% endif %}}"
+        if "scale" in entity:
+            return f"{{{{ (value_json.{param} | float) / {entity['scale']} }}}}"
+        return f"{{{{ value_json.{param} }}}}"
+
+    def build_discovery_configs(self):
+        """
+        生成所有 Home Assistant 自动发现配置，返回 {配置主题: payload}
+        """
+        configs = {}
+        for entity in entities.ENTITIES:
+            # 没有配置场景预设时不发布场景选择
+            if entity["kind"] == 'select' and not self.config.get_presets():
+                continue
+            topic, config = self.generate_config(entity)
+            configs[topic] = config
+        return configs
 
     def publish_discovery_configs(self):
         """
-        发布Home Assistant自动发现配置
+        发布Home Assistant自动发现配置，broker 上已有相同配置的跳过
         """
-        self.connect(self.mqtt_host, self.mqtt_port, 60)
-
-        # 传感器配置
-        sensors = [
-            # ("室温控制", "roomTempControl", "°C"),
-            # ("出水温度", "heatingOutWaterTempControl", "°C"),
-            ("模式", "operationMode", None),
-            ("燃烧状态", "burningState", None),
-            ("热水温度", "hotWaterTempSetting", "°C"),
-            ("锅炉温度", "heatingTempSettingNM", "°C"),
-            ("锅炉温度/节能", "heatingTempSettingHES", "°C"),
-            ("耗气量", "gasConsumption", "m³"),
-            ("供电时间", "supplyTime/totalPowerSupplyTime", "h"),
-            ("使用时间", "supplyTime/actualUseTime", "h"),
-            ("燃烧时间", "supplyTime/totalHeatingBurningTime", "h"),
-            ("地暖燃烧次数", "supplyTime/heatingBurningTimes", "次"),
-            ("热水燃烧次数", "supplyTime/hotWaterBurningTimes", "次")
-
-        ]
-
-        for label, object_id, unit in sensors:
-            topic, config = self.generate_config(
-                'sensor',
-                object_id,
-                f"Rinnai {label}",
-                None,
-                'sensor',
-                unit
-            )
-            self.publish(topic, config, retain=True)
-
-        #温度控制
-        temp_controls = [
-            ("热水温度", "hotWaterTempSetting",self.config.get_local_topics().get("hotWaterTempSetting")),
-            ("锅炉温度", "heatingTempSettingNM",self.config.get_local_topics().get("heatingTempSettingNM")),
-            ("锅炉温度/节能", "heatingTempSettingHES",self.config.get_local_topics().get("heatingTempSettingHES"))
-        ]
-
-
-        for label, object_id, topic in temp_controls:
-            number_topic, number_config = self.generate_config(
-                'number',
-                object_id,
-                f"Rinnai {label}",
-                topic,
-                'number'
-            )
-            self.publish(number_topic, number_config, retain=True)
-
-        # 模式控制
-        mode_controls = [
-            ("节能模式", "energySavingMode", self.config.get_local_topics().get("energySavingMode")),
-            ("外出模式", "outdoorMode", self.config.get_local_topics().get("outdoorMode")),
-            ("快速采暖", "rapidHeating", self.config.get_local_topics().get("rapidHeating")),
-            ("采暖开关", "summerWinter", self.config.get_local_topics().get("summerWinter"))
-        ]
-
-        for label, object_id, topic in mode_controls:
-            switch_topic, switch_config = self.generate_config(
-                'switch',
-                object_id,
-                f"Rinnai {label}",
-                topic,
-                'switch'
-            )
-            self.publish(switch_topic, switch_config, retain=True)
-
-        self.disconnect()
+        published = 0
+        for topic, payload in self.discovery_configs.items():
+            if topic in self.confirmed:
+                continue
+            self.publish(topic, payload, retain=True)
+            self.confirmed.add(topic)
+            published += 1
+        logging.info(f"Published {published} discovery config(s), "
+                     f"{len(self.discovery_configs) - published} unchanged")
@@ -0,0 +1,60 @@
+import logging
+from .mqtt_client import MQTTClientBase
+from processors.history_store import HistoryStore
+from utils import json_codec
+
+
+class HistoryClient(MQTTClientBase):
+    """
+    通过本地 MQTT 查询计数器历史。
+    请求发到 <prefix>/history/get，payload 示例:
+        {"id": "1", "counter": "gasConsumption", "start": 1700000000, "end": 1700086400, "tier": "minute"}
+    start/end/tier 可省略；响应发到 reply_to 或 <prefix>/history/response，
+    reply_to 只能是 <prefix>/history/ 下的主题(不含通配符和请求主题本身)。
+    """
+
+    def __init__(self, config, store: HistoryStore, connection):
+        super().__init__("rinnai_history", client=connection.client)
+        self.config = config
+        self.store = store
+        self.request_topic = f"{config.LOCAL_TOPIC_PREFIX}/history/get"
+        self.response_topic = f"{config.LOCAL_TOPIC_PREFIX}/history/response"
+        self.reply_prefix = f"{config.LOCAL_TOPIC_PREFIX}/history/"
+        self.topics = {"historyRequest": self.request_topic}
+        connection.attach(self)
+
+    def on_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            self.subscribe(self.request_topic)
+
+    def reply_topic(self, reply_to) -> str:
+        """校验请求中的 reply_to，不合法时使用默认响应主题"""
+        if not reply_to:
+            return self.response_topic
+        if (not isinstance(reply_to, str) or not reply_to.startswith(self.reply_prefix)
+                or reply_to == self.request_topic or "+" in reply_to or "#" in reply_to):
+            logging.warning(f"Ignoring invalid history reply_to: {reply_to}")
+            return self.response_topic
+        return reply_to
+
+    def on_message(self, client, userdata, msg):
+        response = {}
+        reply_to = self.response_topic
+        try:
+            request = json_codec.loads(msg.payload)
+            reply_to = self.reply_topic(request.get("reply_to"))
+            response["id"] = request.get("id")
+            counter = request.get("counter")
+            tier, samples = self.store.query(
+                counter, request.get("start"), request.get("end"), request.get("tier"))
+            response.update({
+                "counter": counter,
+                "tier": tier,
+                "samples": [[ts, value] for ts, value in samples]
+            })
+        except KeyError:
+            response["error"] = f"unknown counter, available: {self.store.counters()}"
+        except Exception as e:
+            logging.warning(f"Invalid history request: {e}")
+            response["error"] = str(e)
+        self.publish(reply_to, json_codec.dumps(response))
@@ -1,13 +1,31 @@
 import requests
-import os
-import hashlib
 import logging
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import utils.constants as const
+from utils.device_schemas import get_schema
+from utils.token_cache import TokenCache
+
+
+def create_session():
+    """带连接池和重试退避的 HTTP 会话，可在多个账号间共享"""
+    session = requests.Session()
+    retry = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[500, 502, 503, 504],
+        allowed_methods=["GET"]
+    )
+    adapter = HTTPAdapter(max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
 
 class RinnaiHttpClient:
-    def __init__(self, config):
+    def __init__(self, config, session=None):
         self.config = config
+        self.session = session or create_session()
         self.token = None
         self.device_info = {
             "mac": None,
@@ -17,6 +35,47 @@ class RinnaiHttpClient:
             "deviceId": None
         }
         self.init_param = {}
+        self.cache = TokenCache(
+            self.config.RINNAI_CACHE_DIR,
+            self.config.RINNAI_HTTP_USERNAME,
+            self.config.RINNAI_PASSWORD,
+            self.config.RINNAI_TOKEN_TTL
+        )
+        self.token_from_cache = False
+
+    def _get_json(self, url, params=None, auth=True):
+        """发送 GET 请求，返回 (HTTP状态码, 解析后的 JSON)，响应只解析一次"""
+        headers = {"Authorization": f"Bearer {self.token}"} if auth else None
+        response = self.session.get(
+            url, params=params, headers=headers, timeout=const.HTTP_TIMEOUT)
+        if response.status_code != 200:
+            return response.status_code, None
+        try:
+            return response.status_code, response.json()
+        except ValueError:
+            return response.status_code, None
+
+    def _authorized_get(self, url, params=None):
+        """带 token 的请求；缓存的 token 失效时重新登录并重试一次"""
+        status_code, data = self._get_json(url, params)
+        if (data is None or not data.get("success")) and self.token_from_cache:
+            logging.info("缓存的登录信息已失效，重新登录")
+            self.cache.clear()
+            self.login()
+            status_code, data = self._get_json(url, params)
+        if data is not None and data.get("success"):
+            return data
+        return None
+
+    def authenticate(self):
+        """优先使用未过期的缓存 token，否则登录"""
+        cached = self.cache.load()
+        if cached:
+            self.token = cached["token"]
+            self.token_from_cache = True
+            logging.info("使用缓存的登录信息")
+            return True
+        return self.login()
 
     def login(self):
         """
@@ -31,58 +90,81 @@ class RinnaiHttpClient:
             "identityLevel": "0"
         }
         logging.info(f"正在登录林内服务器...")
-        response = requests.get(const.LOGIN_URL, params=params)
+        status_code, response_data = self._get_json(const.LOGIN_URL, params=params, auth=False)
 
-        if response.status_code != 200:
-            error_msg = f"登录请求失败，HTTP状态码: {response.status_code}"
+        if status_code != 200:
+            error_msg = f"登录请求失败，HTTP状态码: {status_code}"
             logging.error(error_msg)
             raise ConnectionError(error_msg)
 
-        response_data = response.json()
-        if response_data.get("success") == False:
-            error_msg = f"登录验证失败: {response_data.get('message', '未知错误')}"
+        if response_data is None or response_data.get("success") == False:
+            error_msg = f"登录验证失败: {(response_data or {}).get('message', '未知错误')}"
             logging.error(error_msg)
             raise ConnectionError(error_msg)
 
-        self.token = response_data.get("data", {}).get("token")
+        self.token = (response_data.get("data") or {}).get("token")
         if not self.token:
             error_msg = "登录响应中未包含token"
             logging.error(error_msg)
             raise ConnectionError(error_msg)
 
+        self.token_from_cache = False
+        self.cache.save(token=self.token)
         logging.info("登录成功")
         return True
 
-    def get_devices(self):
-        headers = {"Authorization": f"Bearer {self.token}"}
-        response = requests.get(const.INFO_URL, headers=headers)
-        if response.status_code == 200 and response.json().get("success"):
-            devices = response.json().get("data").get("list")
+    @staticmethod
+    def _to_device_info(device):
+        return {
+            "mac": device.get("mac"),
+            "name": device.get("name"),
+            "authCode": device.get("authCode"),
+            "deviceType": device.get("deviceType"),
+            "deviceId": device.get("id")
+        }
+
+    def _fetch_device_list(self):
+        """设备列表包含在线状态和 authCode，每次启动都重新获取，不随 token 缓存"""
+        response_data = self._authorized_get(const.INFO_URL)
+        if response_data:
+            devices = (response_data.get("data") or {}).get("list") or []
             logging.info(f"Devices: {devices}")
-            if devices and devices[0].get("online") == "1":
-                self.device_info = {
-                    "mac": devices[0].get("mac"),
-                    "name": devices[0].get("name"),
-                    "authCode": devices[0].get("authCode"),
-                    "deviceType": devices[0].get("deviceType"),
-                    "deviceId": devices[0].get("id")
-                }
-                return self.device_info
+            return devices
+        return []
+
+    def get_devices(self):
+        devices = self._fetch_device_list()
+        if devices and devices[0].get("online") == "1":
+            self.device_info = self._to_device_info(devices[0])
+            return self.device_info
         logging.error("No devices found or device is offline")
         return None
 
-    def get_process_parameter(self):
-        headers = {"Authorization": f"Bearer {self.token}"}
-        if not self.device_info.get("deviceId"):
+    def get_all_devices(self):
+        """返回账号下所有在线设备的信息"""
+        devices = [self._to_device_info(device)
+                   for device in self._fetch_device_list()
+                   if device.get("online") == "1"]
+        if not devices:
+            logging.error("No devices found or device is offline")
+        return devices
+
+    def get_process_parameter(self, device_id=None, device_type=None):
+        device_id = device_id or self.device_info.get("deviceId")
+        if not device_id:
             logging.error("Device ID not found")
             return None
-        params = {"deviceId": f"{self.device_info.get('deviceId')}"}
-        response = requests.get(const.PROCESS_PARAMETER_URL, params=params,headers=headers)
-        if response.status_code == 200 and response.json().get("success"):
-            data = response.json().get("data")
-            self.init_param = {key: data[key]
-                                for key in const.STATE_PARAMETERS if key in data}
-            return self.init_param
+        params = {"deviceId": f"{device_id}"}
+        response_data = self._authorized_get(const.PROCESS_PARAMETER_URL, params=params)
+        if response_data:
+            data = response_data.get("data")
+            device_type = device_type or self.device_info.get("deviceType")
+            state_parameters = get_schema(device_type)["inf"]
+            init_param = {key: data[key]
+                          for key in state_parameters if key in data}
+            if device_id == self.device_info.get("deviceId"):
+                self.init_param = init_param
+            return init_param
         logging.error("Failed to retrieve process parameters")
         return None
 
@@ -94,7 +176,7 @@ class RinnaiHttpClient:
         return self.init_param
 
     def init_data(self):
-        if self.login():
+        if self.authenticate():
             device_info = self.get_devices()
             if device_info:
                 self.get_process_parameter()
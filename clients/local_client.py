@@ -1,33 +1,41 @@
-import json
 import logging
 from typing import Optional
 from .mqtt_client import MQTTClientBase
+from .local_connection import LocalConnection
 from processors.message_processor import DeviceDataObserver
+from utils import entities, json_codec, log, metrics
 import time
-import ssl
 
 
 class LocalClient(MQTTClientBase, DeviceDataObserver):
-    def __init__(self, config, rinnai_client):
-        super().__init__("rinnai_ha_local")
+    def __init__(self, config, rinnai_client, connection: Optional[LocalConnection] = None):
+        # 未传入共享连接时自建一条，保持单设备用法不变
+        self.connection = connection or LocalConnection(config)
+        super().__init__("rinnai_ha_local", client=self.connection.client)
         self.config = config
         self.rinnai_client = rinnai_client
         self.topics = config.get_local_topics()
-        self.device_data = {}
+        # 命令主题 -> 实体，按主题直接分发
+        self.routes = entities.command_routes(config.LOCAL_TOPIC_PREFIX)
+        # 上次处理的状态版本，相同版本不再比较
+        self.last_version = None
+        self.seen_sections = {}
+        # 各 section 上次发布的内容，用于只发布有变化的 section
+        self.published = {}
+        self.section_publishers = {
+            "state": self.publish_state,
+            "gas": self.publish_gas_consumption,
+            "supplyTime": self.publish_supply_time,
+            "metrics": self.publish_metrics
+        }
+        self.published_stale = None
+        # LOCAL_ATTRIBUTE_TOPICS: {属性主题: 上次发布的值}
+        self.attribute_topics = self.config.LOCAL_ATTRIBUTE_TOPICS
+        self.published_attributes = {}
+        self.force_refresh_interval = self.config.LOCAL_FORCE_REFRESH_INTERVAL * 60
+        self.last_full_refresh = time.monotonic()
         self.rinnai_client.message_processor.register_observer(self)
-
-        if self.config.LOCAL_MQTT_TLS:
-            self.client.tls_set(
-                cert_reqs=ssl.CERT_NONE, tls_version=ssl.PROTOCOL_TLSv1_2
-            )
-            self.client.tls_insecure_set(True)
-            logging.info("Local MQTT TLS enabled")
-
-        if self.config.LOCAL_MQTT_USERNAME and self.config.LOCAL_MQTT_PASSWORD:
-            self.client.username_pw_set(
-                self.config.LOCAL_MQTT_USERNAME, self.config.LOCAL_MQTT_PASSWORD
-            )
-            logging.info("Local MQTT authentication enabled")
+        self.connection.attach(self)
 
     def on_connect(self, client, userdata, flags, rc):
         logging.info(f"Local MQTT connect status: {rc}")
@@ -35,48 +43,65 @@ class LocalClient(MQTTClientBase, DeviceDataObserver):
             # Subscribe to all local topics
             for topic in self.topics.values():
                 self.subscribe(topic)
-        time.sleep(1)
-        self.rinnai_client.set_default_status()
+        # 重连后 broker 上没有最新状态，下一次更新需要完整发布
+        self.published.clear()
+        self.published_stale = None
+        self.published_attributes.clear()
+        self.last_version = None
+        self.seen_sections.clear()
+        # 只重新发布当前快照；INIT_STATUS 只在引导时应用一次，重连时再应用会覆盖更新的云端状态
+        self.rinnai_client.message_processor.notify_observers()
 
-    @staticmethod
-    def get_switch_status(switch: str, operationMode: str) -> bool:
-        """
-        根据 switch 返回对应的 switch状态,返回true=switch为开, false=switch为关
-        """
-        # 定义模式对应的 operationMode 值集合
-        mode_codes = {
-            "energySavingMode": ["采暖节能", "快速采暖/节能"],
-            "outdoorMode": ["采暖外出", "快速采暖/外出"],
-            "rapidHeating": [
-                "快速采暖",
-                "快速采暖/节能",
-                "快速采暖/外出",
-                "快速采暖/预约",
-            ],
-            "summerWinter": ["关机", "采暖关闭", "休眠"]
-        }
-        # 构建用于判断的模板字符串
-        if switch == "summerWinter":
-            return operationMode not in mode_codes.get(switch, [])
+    def current_state(self):
+        """processor 的最新快照，不可变，任何线程读取都不需要加锁"""
+        return self.rinnai_client.message_processor.device_data["state"]
+
+    def preset_params(self, preset: dict) -> dict:
+        """计算预设与当前状态的差异，返回需要下发的 {参数id: data}"""
+        state = self.current_state()
+        params = {}
+        for param_id, value in preset.items():
+            if param_id in entities.TEMPERATURES:
+                if state.get(param_id) != str(value):
+                    params[param_id] = hex(value)[2:].upper().zfill(2)
+            else:
+                switch_status = entities.switch_status(param_id, state.get("operationMode"))
+                if (value == "ON") != switch_status:
+                    params[param_id] = "31"
+        return params
+
+    def apply_preset(self, name: str) -> None:
+        preset = self.config.get_presets().get(name)
+        if preset is None:
+            logging.warning(f"Unknown preset: {name}")
+            return
+        params = self.preset_params(preset)
+        if params:
+            # 所有差异打包成一条 enl 帧
+            self.rinnai_client.command_batcher.send_now(params)
+            logging.info(f"Applied preset {name}: {params}")
         else:
-            return operationMode in mode_codes.get(switch, [])
+            logging.info(f"Device already matches preset {name}, command will not be sent!")
+        self.publish(self.topics["presetState"], name, retain=True)
 
     def on_message(self, client, userdata, msg):
+        entity = self.routes.get(msg.topic)
+        if entity is None:
+            return
         try:
-            action = msg.topic.split("/")[-2]
-            if action == "temp":
+            kind = entity["kind"]
+            if kind == "select":
+                self.apply_preset(msg.payload.decode())
+            elif kind == "number":
                 temperature = int(msg.payload.decode())
-                heat_type = msg.topic.split("/")[-1]
-                self.rinnai_client.set_temperature(heat_type, temperature)
-            elif action == "mode":
-                mode = msg.topic.split("/")[-1]
+                self.rinnai_client.set_temperature(entity["param"], temperature)
+            elif kind == "switch":
+                mode = entity["param"]
                 payload = msg.payload.decode()
-                switch_status = LocalClient.get_switch_status(
-                    mode, self.device_data["state"]["operationMode"]
-                )
+                switch_status = entities.switch_status(mode, self.current_state().get("operationMode"))
                 if (payload == "ON" and not switch_status) or (payload == "OFF" and switch_status):
-                    #self.rinnai_client.set_mode(mode)
-                    self.rinnai_client.send_command(mode, payload)
+                    # J00 帧中 "31" 表示切换该模式，与场景预设的下发方式一致
+                    self.rinnai_client.set_mode(mode)
                 else:
                     logging.info(
                         msg=f"the switch {mode} is in {payload} already, command will not be sent!"
@@ -84,37 +109,106 @@ class LocalClient(MQTTClientBase, DeviceDataObserver):
         except Exception as e:
             logging.error(f"Local MQTT set failed: {e}")
 
-    def update(self, device_data: dict) -> None:
-        """Update device data from MessageProcessor."""
+    def _changed_fields(self, section: str, data: dict) -> list:
+        """对比上次发布的内容，返回有变化的字段"""
+        published = self.published.get(section)
+        if published is None:
+            return list(data)
+        changed = [key for key, value in data.items() if published.get(key) != value]
+        changed.extend(key for key in published if key not in data)
+        return changed
+
+    def _force_refresh_due(self) -> bool:
+        if self.force_refresh_interval <= 0:
+            return False
+        return time.monotonic() - self.last_full_refresh >= self.force_refresh_interval
+
+    def update(self, device_data) -> None:
+        """Update device data from MessageProcessor, publishing only changed sections."""
         # 检查是否有新的 device_data，且状态数据不为空
-        if device_data:
-            if device_data.get("state"):
-                self.device_data["state"] = device_data["state"]
-                self.publish_state(self.device_data["state"])
-
-            if device_data.get("gas"):
-                self.device_data["gas"] = device_data["gas"]
-                self.publish_gas_consumption(self.device_data["gas"])
-
-            if device_data.get("supplyTime"):
-                self.device_data["supplyTime"] = device_data["supplyTime"]
-                self.publish_supply_time(self.device_data["supplyTime"])
-        else:
+        if not device_data:
             logging.warning("Received empty device data; no updates made.")
+            return
+
+        force = self._force_refresh_due()
+        if device_data.version == self.last_version and not force:
+            return
+        self.last_version = device_data.version
+        for section, publisher in self.section_publishers.items():
+            data = device_data.get(section)
+            if not data:
+                continue
+            # 未变化的 section 在新旧快照间是同一个对象，不必逐字段比较
+            if data is self.seen_sections.get(section) and not force:
+                continue
+            self.seen_sections[section] = data
+            changed = self._changed_fields(section, data)
+            if not changed and not force:
+                continue
+            # 快照中的 section 是只读视图，发布和比较用普通字典
+            self.published[section] = dict(data)
+            logging.debug("%s changed fields: %s", section, changed)
+            publisher(self.published[section])
+            if self.attribute_topics:
+                self.publish_attributes(section, self.published[section], list(data) if force else changed)
+
+        stale = device_data.stale
+        if stale != self.published_stale:
+            self.published_stale = stale
+            self.publish(self.topics["stale"], "ON" if stale else "OFF", retain=True)
+
+        if force:
+            self.last_full_refresh = time.monotonic()
+
+    def publish_section(self, section: str, payload):
+        self.publish(self.topics[section], payload)
+        if metrics.ENABLED:
+            metrics.LOCAL_PUBLISHES.inc(section)
+            metrics.LOCAL_PUBLISH_BYTES.inc(section, amount=len(payload.encode("utf-8")))
+
+    @staticmethod
+    def attribute_values(section: str, data: dict, fields: list):
+        """
+        生成 (属性名, 值) ，值已换算为实体直接显示的形式：
+        燃气量换算为 m³，operationMode 变化时附带各模式开关的 ON/OFF
+        """
+        for field in fields:
+            value = data.get(field)
+            if value is None:
+                continue
+            scale = entities.SCALES.get(field)
+            if scale is not None:
+                value = f"{int(value) / scale:.4f}"
+            yield field, value
+            if section == "state" and field == "operationMode":
+                for switch, status in entities.switch_statuses(value).items():
+                    yield switch, "ON" if status else "OFF"
+
+    def publish_attributes(self, section: str, data: dict, fields: list):
+        """每个属性发布到单独的保留主题，值没有变化的跳过"""
+        for name, value in self.attribute_values(section, data, fields):
+            topic = self.config.get_attribute_topic(name)
+            if self.published_attributes.get(topic) == value:
+                continue
+            self.published_attributes[topic] = value
+            self.publish(topic, value, retain=True)
 
     def publish_state(self, state_data: dict):
         """Publish device state to local MQTT broker."""
-        self.publish(self.topics["state"], json.dumps(state_data, ensure_ascii=False))
-        logging.info(f"Published state to local MQTT: {state_data}")
+        self.publish_section("state", json_codec.dumps(state_data))
+        logging.info("Published state to local MQTT: %s", state_data, extra=log.SAMPLED)
 
     def publish_gas_consumption(self, gas_data: dict):
         """Publish gas consumption to local MQTT broker."""
-        self.publish(self.topics["gas"], json.dumps(gas_data, ensure_ascii=False))
-        logging.info(f"Published gas consumption to local MQTT: {gas_data}")
+        self.publish_section("gas", json_codec.dumps(gas_data))
+        logging.info("Published gas consumption to local MQTT: %s", gas_data, extra=log.SAMPLED)
 
     def publish_supply_time(self, supply_time_data: dict):
         """Publish supply time to local MQTT broker."""
-        self.publish(
-            self.topics["supplyTime"], json.dumps(supply_time_data, ensure_ascii=False)
-        )
-        logging.info(f"Published supply time to local MQTT: {supply_time_data}")
+        self.publish_section("supplyTime", json_codec.dumps(supply_time_data))
+        logging.info("Published supply time to local MQTT: %s", supply_time_data, extra=log.SAMPLED)
+
+    def publish_metrics(self, metrics_data: dict):
+        """Publish derived energy metrics to local MQTT broker."""
+        self.publish_section("metrics", json_codec.dumps(metrics_data))
+        logging.info("Published energy metrics to local MQTT: %s", metrics_data, extra=log.SAMPLED)
@@ -0,0 +1,53 @@
+import ssl
+import logging
+from .mqtt_client import MQTTClientBase
+
+
+class LocalConnection(MQTTClientBase):
+    """
+    本地 MQTT broker 的共享连接。
+    多台设备的 LocalClient 复用同一条连接，按主题把消息分发给对应设备。
+    """
+
+    def __init__(self, config):
+        super().__init__("rinnai_ha_local")
+        self.config = config
+        self.devices = []
+        self.routes = {}
+        # 连接成功时调用，用于启动就绪判断
+        self.on_ready = None
+
+        if self.config.LOCAL_MQTT_TLS:
+            self.client.tls_set(
+                cert_reqs=ssl.CERT_NONE, tls_version=ssl.PROTOCOL_TLSv1_2
+            )
+            self.client.tls_insecure_set(True)
+            logging.info("Local MQTT TLS enabled")
+
+        if self.config.LOCAL_MQTT_USERNAME and self.config.LOCAL_MQTT_PASSWORD:
+            self.client.username_pw_set(
+                self.config.LOCAL_MQTT_USERNAME, self.config.LOCAL_MQTT_PASSWORD
+            )
+            logging.info("Local MQTT authentication enabled")
+
+    def attach(self, device_client):
+        """注册一台设备的 LocalClient，其订阅主题的消息会路由给它"""
+        self.devices.append(device_client)
+        for topic in device_client.topics.values():
+            self.routes[topic] = device_client
+        # 启动时设备可能在连接建立之后才注册，此时直接补做连接后的初始化
+        if self.client.is_connected():
+            device_client.on_connect(self.client, None, None, 0)
+
+    def on_connect(self, client, userdata, flags, rc):
+        for device_client in list(self.devices):
+            device_client.on_connect(client, userdata, flags, rc)
+        if rc == 0 and self.on_ready:
+            self.on_ready()
+
+    def on_message(self, client, userdata, msg):
+        device_client = self.routes.get(msg.topic)
+        if device_client is None:
+            logging.debug("No local handler for topic: %s", msg.topic)
+            return
+        device_client.on_message(client, userdata, msg)
@@ -6,14 +6,17 @@ from abc import ABC, abstractmethod
 
 
 class MQTTClientBase(ABC):
-    def __init__(self, client_prefix):
-        ts = datetime.datetime.now()
-        self.client = mqtt.Client(
-            client_id=f"{client_prefix}:{ts.second}{ts.microsecond}",
-            callback_api_version=mqtt.CallbackAPIVersion.VERSION1
-        )
-        self.client.on_connect = self.on_connect
-        self.client.on_message = self.on_message
+    def __init__(self, client_prefix, client=None):
+        if client is None:
+            ts = datetime.datetime.now()
+            client = mqtt.Client(
+                client_id=f"{client_prefix}:{ts.second}{ts.microsecond}",
+                callback_api_version=mqtt.CallbackAPIVersion.VERSION1
+            )
+            client.on_connect = self.on_connect
+            client.on_message = self.on_message
+        # 传入 client 时复用已有连接，回调由连接的拥有者负责分发
+        self.client = client
         self.topics = {}
 
     @abstractmethod
@@ -34,7 +37,7 @@ class MQTTClientBase(ABC):
         return self.client.publish(topic, payload, qos, retain)
 
     def subscribe(self, topics):
-        self.client.subscribe(topics)
+        return self.client.subscribe(topics)
 
     def start(self):
         self.client.loop_start()
@@ -0,0 +1,121 @@
+import time
+import random
+import logging
+import threading
+from typing import Optional
+import utils.constants as const
+from processors.message_processor import DeviceDataObserver
+from processors.energy_metrics import BURNING_NAMES
+
+# 关机/休眠时设备状态基本不会变化，退避得更快
+OFF_MODES = {const.OPERATION_MODES["0"], const.OPERATION_MODES["2"]}
+IDLE_BACKOFF = 2
+OFF_BACKOFF = 4
+
+
+class AdaptiveRefresh(DeviceDataObserver):
+    """
+    按需连接模式下的刷新调度，代替固定的 RINNAI_UPDATE_INTERVAL。
+    燃烧中或下发命令后的 RINNAI_UPDATE_INTERVAL 秒内每 RINNAI_REFRESH_MIN 秒刷新一次；
+    待机时从 RINNAI_UPDATE_INTERVAL 开始按 2 倍、关机/休眠时按 4 倍退避，最长 RINNAI_REFRESH_MAX。
+    每次间隔加入 ±RINNAI_REFRESH_JITTER 的随机抖动，避免多个桥接同时连接。
+    """
+
+    def __init__(self, rinnai_client, config, rng: Optional[random.Random] = None):
+        self.rinnai_client = rinnai_client
+        self.min_interval = config.RINNAI_REFRESH_MIN
+        self.base_interval = max(config.RINNAI_UPDATE_INTERVAL, self.min_interval)
+        self.max_interval = max(config.RINNAI_REFRESH_MAX, self.base_interval)
+        self.jitter = config.RINNAI_REFRESH_JITTER
+        self.rng = rng or random.Random()
+        # 当前退避到的间隔，活跃时为 None
+        self.interval: Optional[float] = None
+        self.activity = "idle"
+        self.boost_until = 0.0
+        self.last_version = None
+        self.timer = None
+        self.due = None
+        self.stopped = False
+        self.lock = threading.Lock()
+        rinnai_client.message_processor.register_observer(self)
+
+    @staticmethod
+    def classify(state) -> str:
+        """active / off / idle"""
+        if state.get("burningState") in BURNING_NAMES:
+            return "active"
+        if state.get("operationMode") in OFF_MODES:
+            return "off"
+        return "idle"
+
+    def next_interval(self, now: float) -> float:
+        """计算下一次刷新的间隔(含抖动)，并推进退避"""
+        if self.activity == "active" or now < self.boost_until:
+            self.interval = None
+            interval = self.min_interval
+        else:
+            factor = OFF_BACKOFF if self.activity == "off" else IDLE_BACKOFF
+            if self.interval is None:
+                self.interval = self.base_interval
+            else:
+                self.interval = min(self.interval * factor, self.max_interval)
+            interval = self.interval
+        return interval * self.rng.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def start(self) -> None:
+        self._refresh()
+
+    def _refresh(self) -> None:
+        with self.lock:
+            if self.stopped:
+                return
+            self.timer = None
+            self.due = None
+            delay = self.next_interval(time.monotonic())
+            activity = self.activity
+        self.rinnai_client.connect_and_update(delay)
+        logging.info(f"Next Rinnai refresh in {delay:.0f}s ({activity})")
+        self._schedule(delay)
+
+    def _schedule(self, delay: float, only_if_sooner: bool = False) -> None:
+        with self.lock:
+            if self.stopped:
+                return
+            due = time.monotonic() + delay
+            if only_if_sooner and self.due is not None and self.due <= due:
+                return
+            if self.timer:
+                self.timer.cancel()
+            self.due = due
+            self.timer = self.rinnai_client.scheduler.call_later(delay, self._refresh)
+
+    def _jittered_min(self) -> float:
+        return self.min_interval * self.rng.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def on_command(self) -> None:
+        """下发命令后一段时间内加快刷新，尽快拿到设备确认后的状态"""
+        with self.lock:
+            self.boost_until = time.monotonic() + self.base_interval
+            self.interval = None
+        self._schedule(self._jittered_min(), only_if_sooner=True)
+
+    def update(self, device_data) -> None:
+        if device_data.version == self.last_version:
+            return
+        self.last_version = device_data.version
+        activity = self.classify(device_data["state"])
+        with self.lock:
+            became_active = activity == "active" and self.activity != "active"
+            if activity != self.activity:
+                # 状态变化后重新开始退避
+                self.interval = None
+            self.activity = activity
+        if became_active:
+            self._schedule(self._jittered_min(), only_if_sooner=True)
+
+    def stop(self) -> None:
+        with self.lock:
+            self.stopped = True
+            if self.timer:
+                self.timer.cancel()
+                self.timer = None
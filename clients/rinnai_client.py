@@ -1,8 +1,15 @@
 import ssl
+import time
 import json
 import logging
-import threading
 from .mqtt_client import MQTTClientBase
+from .command_batcher import CommandBatcher
+from .connection_lease import ConnectionLeaseManager
+from .command_tracker import CommandTracker
+from .refresh_scheduler import AdaptiveRefresh
+from utils import json_codec, log, metrics
+from utils.scheduler import ThreadScheduler
+from utils.frame_log import FrameLogWriter
 from processors.message_processor import MessageProcessor
 
 
@@ -12,42 +19,86 @@ class RinnaiClient(MQTTClientBase):
         self.config = config
         self.message_processor = message_processor
         self.topics = config.get_rinnai_topics()
+        # 订阅主题 -> inf/stg/set，收到消息时不再拆分主题字符串
+        self.topic_kinds = {topic: kind for kind, topic in self.topics.items()}
         self.connected = False
         self.update_timer = None
-        self.disconnect_timer = None
+        # asyncio 模式下替换为 AsyncioScheduler，并且不启动 paho 网络线程
+        self.scheduler = ThreadScheduler()
+        self.use_loop_thread = True
+        # asyncio 运行时下的 AsyncioMQTTHelper，连接和重连交给它，不阻塞事件循环
+        self.helper = None
+        self.command_batcher = CommandBatcher(self, self.config.RINNAI_COMMAND_WINDOW)
+        self.leases = ConnectionLeaseManager(self, self.config.RINNAI_IDLE_TIMEOUT)
+        self.pending_subscriptions = set()
+        self.command_tracker = CommandTracker(
+            self, self.config.RINNAI_COMMAND_ACK_TIMEOUT,
+            self.config.RINNAI_COMMAND_RETRIES, self.config.RINNAI_OPTIMISTIC)
+        # 按需连接时根据设备状态调整刷新间隔
+        self.refresh = None
+        if self.config.RINNAI_ON_DEMAND and self.config.RINNAI_ADAPTIVE_REFRESH:
+            self.refresh = AdaptiveRefresh(self, self.config)
+        # 记录收到的原始帧
+        self.capture = None
+        if self.config.RINNAI_CAPTURE_DIR:
+            self.capture = FrameLogWriter(
+                self.config.get_capture_path(),
+                self.config.RINNAI_CAPTURE_MAX_BYTES,
+                self.config.RINNAI_CAPTURE_BACKUPS)
+        self.client.on_subscribe = self.on_subscribe
+        self.client.on_disconnect = self.on_disconnect
         logging.info(f"Rinnai topics: {self.topics}")
         logging.info(f"Rinnai client 当前连接状态: {self.connected}")
 
-        # Configure TLS
-        self.client.tls_set(
-            cert_reqs=ssl.CERT_NONE,
-            tls_version=ssl.PROTOCOL_TLSv1_2
-        )
-        self.client.tls_insecure_set(True)
+        # Configure TLS，连接本地模拟器时可以关闭
+        if self.config.RINNAI_TLS:
+            self.client.tls_set(
+                cert_reqs=ssl.CERT_NONE,
+                tls_version=ssl.PROTOCOL_TLSv1_2
+            )
+            self.client.tls_insecure_set(True)
         self.client.username_pw_set(
             self.config.RINNAI_USERNAME, self.config.RINNAI_PASSWORD)
 
     def schedule_update(self):
-        """定时更新任务"""
-        self.connect_and_update()
-        self.update_timer = threading.Timer(
+        """定时更新任务，开启自适应刷新时由 AdaptiveRefresh 决定间隔"""
+        if self.refresh:
+            self.refresh.start()
+            return
+        self.connect_and_update(self.config.RINNAI_UPDATE_INTERVAL)
+        self.update_timer = self.scheduler.call_later(
             self.config.RINNAI_UPDATE_INTERVAL, self.schedule_update)
-        self.update_timer.start()
 
-    def connect_and_update(self):
-        """连接并获取更新"""
+    def connect_and_update(self, interval: float):
+        """
+        连接并获取更新。保持连接 RINNAI_CONNECT_TIMEOUT 秒，但不超过刷新间隔的一半，
+        加上 RINNAI_IDLE_TIMEOUT 后两次刷新之间仍有断开的时间
+        """
+        hold = min(self.config.RINNAI_CONNECT_TIMEOUT, interval / 2)
+        self.leases.hold_for(hold)
+        logging.info(f"已设置 {hold:.0f} 秒后释放连接")
+
+    def open_connection(self):
+        """建立连接，由租约管理器在第一个租约时调用"""
         if not self.connected:
             logging.info(f"Rinnai client 开始连接，当前状态: {self.connected}")
-            self.connect(self.config.RINNAI_HOST, self.config.RINNAI_PORT)
+            if self.helper:
+                self.helper.connect(self.config.RINNAI_HOST, self.config.RINNAI_PORT)
+            else:
+                self.connect(self.config.RINNAI_HOST, self.config.RINNAI_PORT)
             self.connected = True
+            if self.use_loop_thread:
+                self.start()
             logging.info(f"Rinnai client 连接完成，当前状态: {self.connected}")
-            # 设置断开连接定时器
-            if self.disconnect_timer:
-                self.disconnect_timer.cancel()
-            self.disconnect_timer = threading.Timer(
-                self.config.RINNAI_CONNECT_TIMEOUT, self.disconnect_and_cleanup)
-            self.disconnect_timer.start()
-            logging.info(f"已设置 {self.config.RINNAI_CONNECT_TIMEOUT} 秒后自动断开")
+
+    def close_connection(self):
+        if self.helper:
+            # 连接被拒绝后 helper 可能已安排重连，主动关闭时一并取消
+            self.helper.cancel_reconnect()
+        self.disconnect_and_cleanup()
+        if self.use_loop_thread:
+            # 主动断开后 paho 网络线程会退出，下次连接时重新启动
+            super().stop()
 
     def disconnect_and_cleanup(self):
         """断开连接并清理"""
@@ -55,23 +106,38 @@ class RinnaiClient(MQTTClientBase):
             logging.info(f"Rinnai client 开始断开连接，当前状态: {self.connected}")
             self.disconnect()
             self.connected = False
+            self.leases.on_disconnected()
             logging.info(f"Rinnai client 断开连接完成，当前状态: {self.connected}")
 
 
     def send_command(self, topic, payload):
-        """发送命令时临时连接"""
-        self.connect_and_update()
-        self.publish(topic, payload)
+        """发送命令时临时连接，订阅完成后再发送"""
+        self.leases.run(lambda: self.publish(topic, payload))
 
     def stop(self):
         """停止所有定时器"""
         logging.info("Rinnai client 开始停止所有定时器")
+        # 先发出窗口内尚未发送的命令
+        self.command_batcher.flush()
         if self.update_timer:
             self.update_timer.cancel()
-        if self.disconnect_timer:
-            self.disconnect_timer.cancel()
-        self.disconnect_and_cleanup()
-    
+        if self.refresh:
+            self.refresh.stop()
+        self.leases.close()
+        self.command_tracker.close()
+        self.close_connection()
+        if self.capture:
+            self.capture.close()
+
+    def on_subscribe(self, client, userdata, mid, granted_qos):
+        self.pending_subscriptions.discard(mid)
+        if not self.pending_subscriptions:
+            logging.info("所有主题订阅完成")
+            self.leases.on_ready()
+
+    def on_disconnect(self, client, userdata, rc):
+        self.leases.on_disconnected()
+
     def on_connect(self, client, userdata, flags, rc):
         """
         rc 值含义：
@@ -91,67 +157,87 @@ class RinnaiClient(MQTTClientBase):
             5: "未授权"
         }
         message = rc_messages.get(rc, f"未知错误 {rc}")
+        if metrics.ENABLED:
+            metrics.UPSTREAM_CONNECTS.inc(str(rc))
         logging.info(f"Rinnai MQTT连接状态: {message}")
         if rc == 0:
             logging.info("开始订阅主题...")
             for topic in self.topics.values():
-                self.subscribe(topic)
+                _, mid = self.subscribe(topic)
+                self.pending_subscriptions.add(mid)
                 logging.debug(f"已订阅主题: {topic}")
-            logging.info("所有主题订阅完成")
+        else:
+            self.leases.on_connect_failed(rc)
         
         # self.set_default_status()
         
 
 
     def on_message(self, client, userdata, msg):
+        if self.capture:
+            self.capture.write(time.time(), msg.topic, msg.payload)
         try:
-            logging.info(
-                f"Rinnai msg topic: {msg.topic}, payload: {json.loads(msg.payload.decode('utf-8'))}")
-            self.message_processor.process_message(msg)
+            # 每帧只解析一次，解析结果和主题类型直接交给 processor
+            parsed_data = json_codec.loads(msg.payload)
+            topic_kind = self.topic_kinds.get(msg.topic) or msg.topic.split('/')[-2]
+            if metrics.ENABLED:
+                metrics.FRAMES.inc(topic_kind)
+            logging.info("Rinnai msg topic: %s, payload: %s", msg.topic, parsed_data, extra=log.SAMPLED)
+            self.message_processor.process_frame(topic_kind, parsed_data)
+        except json_codec.JSONDecodeError:
+            logging.error("Failed to parse JSON message")
         except Exception as e:
             logging.error(f"Rinnai message error: {e}")
 
-    def set_temperature(self, heat_type, temperature):
-        if not heat_type:
-            raise ValueError("Error: heat type not specified")
-
-        request_payload = {
+    def build_set_payload(self, params: dict) -> dict:
+        """把 {参数id: data} 打包成一条 J00 帧"""
+        return {
             "code": self.config.AUTH_CODE,
             "enl": [
                 {
-                    "data": hex(temperature)[2:].upper().zfill(2),
-                    "id": heat_type
+                    "data": data,
+                    "id": param_id
                 }
+                for param_id, data in params.items()
             ],
             "id": self.config.DEVICE_TYPE,
             "ptn": "J00",
-            "sum": "1"
+            "sum": str(len(params))
         }
-        self.publish(self.topics["set"], json.dumps(request_payload), qos=1)
+
+    def publish_params(self, params: dict, track=True):
+        request_payload = self.build_set_payload(params)
+        if track:
+            self.command_tracker.track(params)
+        if self.refresh:
+            self.refresh.on_command()
+        self.leases.run(
+            lambda: self.publish(self.topics["set"], json.dumps(request_payload), qos=1))
+        logging.info("Set parameters: %s", params)
+
+    def set_temperature(self, heat_type, temperature):
+        if not heat_type:
+            raise ValueError("Error: heat type not specified")
+
+        # 短时间内的多次设置会合并为一条命令，预期值先发布
+        data = hex(temperature)[2:].upper().zfill(2)
+        self.command_tracker.apply_optimistic({heat_type: data})
+        self.command_batcher.submit(heat_type, data)
         logging.info(f"Set {heat_type} temperature to {temperature}°C")
 
     def set_mode(self, mode):
         if not mode:
             raise ValueError("Error: mode not specified")
 
-        request_payload = {
-            "code": self.config.AUTH_CODE,
-            "enl": [
-                {
-                    "data": "31",
-                    "id": mode
-                }
-            ],
-            "id": self.config.DEVICE_TYPE,
-            "ptn": "J00",
-            "sum": "1"
-        }
-        self.publish(self.topics["set"], json.dumps(request_payload), qos=1)
+        self.publish_params({mode: "31"})
         logging.info(f"Set mode to: {mode}")
 
     def set_default_status(self):
         default_status = {'enl': []}
-        for key, value in self.config.INIT_STATUS.items():
+        for key, value in (self.config.INIT_STATUS or {}).items():
             default_status['enl'].append({'id': key, 'data': value})
-        self.message_processor._process_device_info(default_status)
-        self.message_processor.notify_observers()
+        if default_status['enl']:
+            # processParameter 返回的是云端的最新数据
+            self.message_processor.apply_device_info(default_status, stale=False)
+        else:
+            self.message_processor.notify_observers()
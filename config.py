@@ -1,24 +1,92 @@
 import os
 import hashlib
 from dotenv import load_dotenv
+from utils.presets import load_presets
+from utils import entities
 
 load_dotenv()
 
 
+def hash_password(password):
+    """林内 MQTT/HTTP 使用大写的 md5 密码"""
+    return str.upper(hashlib.md5((password or '').encode('utf-8')).hexdigest())
+
+
+def parse_accounts(value):
+    """
+    解析 RINNAI_ACCOUNTS，格式: "phone1:password1,phone2:password2"
+    返回 [(username, password), ...]
+    """
+    accounts = []
+    for item in (value or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        username, _, password = item.partition(':')
+        if not username or not password:
+            raise ValueError(f"Invalid RINNAI_ACCOUNTS entry: {item}")
+        accounts.append((username.strip(), password))
+    return accounts
+
+
 class Config:
     # Rinnai MQTT settings
     RINNAI_HTTP_USERNAME = os.getenv('RINNAI_USERNAME')
     RINNAI_HOST = os.getenv('RINNAI_HOST', 'mqtt.rinnai.com.cn')
     RINNAI_PORT = int(os.getenv('RINNAI_PORT', '8883'))
+    RINNAI_TLS = os.getenv('RINNAI_TLS', 'True').lower() == 'true'
     RINNAI_USERNAME = f"a:rinnai:SR:01:SR:{os.getenv('RINNAI_USERNAME')}"
-    RINNAI_PASSWORD = str.upper(
-        hashlib.md5(os.getenv('RINNAI_PASSWORD').encode('utf-8')).hexdigest())
+    RINNAI_PASSWORD = hash_password(os.getenv('RINNAI_PASSWORD'))
+    # 多账号: "phone1:password1,phone2:password2"，设置后桥接所有账号下的所有在线设备
+    RINNAI_ACCOUNTS = parse_accounts(os.getenv('RINNAI_ACCOUNTS'))
+    # 单账号下也桥接所有在线设备（默认只桥接第一台）
+    RINNAI_ALL_DEVICES = os.getenv('RINNAI_ALL_DEVICES', 'False').lower() == 'true'
 
     # 新增配置项
     RINNAI_UPDATE_INTERVAL = int(
         os.getenv('RINNAI_UPDATE_INTERVAL', '300'))  # 默认5分钟更新一次
     RINNAI_CONNECT_TIMEOUT = int(
-        os.getenv('RINNAI_CONNECT_TIMEOUT', '300'))   # 连接后保持30秒
+        os.getenv('RINNAI_CONNECT_TIMEOUT', '300'))   # 按需连接时每次刷新后最多保持的秒数，不超过刷新间隔的一半
+    # 登录 token 和设备列表的缓存目录及有效期(小时)，有效期为 0 时不缓存
+    RINNAI_CACHE_DIR = os.getenv('RINNAI_CACHE_DIR', '.cache')
+    RINNAI_TOKEN_TTL = int(float(os.getenv('RINNAI_TOKEN_TTL_HOURS', '24')) * 3600)
+    # 把最新状态保存到缓存目录，重启后立即发布上次的状态
+    RINNAI_STATE_SNAPSHOT = os.getenv('RINNAI_STATE_SNAPSHOT', 'True').lower() == 'true'
+    # 把林内推送的原始帧记录到该目录，供 replay.py 回放，空表示不记录
+    RINNAI_CAPTURE_DIR = os.getenv('RINNAI_CAPTURE_DIR', '')
+    RINNAI_CAPTURE_MAX_BYTES = int(float(os.getenv('RINNAI_CAPTURE_MAX_MB', '16')) * 1024 * 1024)
+    RINNAI_CAPTURE_BACKUPS = int(os.getenv('RINNAI_CAPTURE_BACKUPS', '5'))
+    # gas/supplyTime 计数器的内存历史，各层级保留的样本数
+    HISTORY_ENABLED = os.getenv('HISTORY_ENABLED', 'True').lower() == 'true'
+    HISTORY_SIZES = {
+        "raw": int(os.getenv('HISTORY_RAW_SIZE', '1440')),
+        "minute": int(os.getenv('HISTORY_MINUTE_SIZE', '1440')),   # 1 天
+        "hour": int(os.getenv('HISTORY_HOUR_SIZE', '2160'))        # 90 天
+    }
+    # 按需连接：不保持常驻连接，定时连接获取更新、发送命令时临时连接
+    RINNAI_ON_DEMAND = os.getenv('RINNAI_ON_DEMAND', 'False').lower() == 'true'
+    # 最后一个连接租约释放后保持连接的秒数
+    RINNAI_IDLE_TIMEOUT = int(os.getenv('RINNAI_IDLE_TIMEOUT', '60'))
+    # 按需连接时根据设备状态调整刷新间隔：燃烧中或刚下发命令时每 RINNAI_REFRESH_MIN 秒刷新，
+    # 待机/关机时从 RINNAI_UPDATE_INTERVAL 开始指数退避到 RINNAI_REFRESH_MAX，间隔带 ±RINNAI_REFRESH_JITTER 的随机抖动
+    RINNAI_ADAPTIVE_REFRESH = os.getenv('RINNAI_ADAPTIVE_REFRESH', 'True').lower() == 'true'
+    RINNAI_REFRESH_MIN = int(os.getenv('RINNAI_REFRESH_MIN', '60'))
+    RINNAI_REFRESH_MAX = int(os.getenv('RINNAI_REFRESH_MAX', '3600'))
+    RINNAI_REFRESH_JITTER = float(os.getenv('RINNAI_REFRESH_JITTER', '0.2'))
+    # 温度设置的合并窗口(毫秒)，窗口内同一参数只发送最后一个值，0 表示立即发送
+    RINNAI_COMMAND_WINDOW = int(os.getenv('RINNAI_COMMAND_WINDOW_MS', '300')) / 1000
+    # 下发命令后立即发布预期状态，等待设备上报确认
+    RINNAI_OPTIMISTIC = os.getenv('RINNAI_OPTIMISTIC', 'True').lower() == 'true'
+    # 等待确认的秒数，超时后温度设置重发 RINNAI_COMMAND_RETRIES 次，仍未确认则回滚
+    RINNAI_COMMAND_ACK_TIMEOUT = float(os.getenv('RINNAI_COMMAND_ACK_TIMEOUT', '10'))
+    RINNAI_COMMAND_RETRIES = int(os.getenv('RINNAI_COMMAND_RETRIES', '1'))
+    # 观察者(本地发布、快照等)在独立线程中执行，不阻塞林内连接的网络线程
+    RINNAI_DISPATCH_QUEUE = os.getenv('RINNAI_DISPATCH_QUEUE', 'True').lower() == 'true'
+    # 使用单线程 asyncio 运行时代替 paho 网络线程和 threading.Timer
+    ASYNCIO_RUNTIME = os.getenv('ASYNCIO_RUNTIME', 'False').lower() == 'true'
+    # Prometheus 指标端口，0 表示不开启
+    METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+    METRICS_HOST = os.getenv('METRICS_HOST', '0.0.0.0')
     DEVICE_SN = None
     AUTH_CODE = None
     DEVICE_TYPE = None
@@ -30,7 +98,22 @@ class Config:
     LOCAL_MQTT_USERNAME =os.getenv('LOCAL_MQTT_USERNAME', None)
     LOCAL_MQTT_PASSWORD =os.getenv('LOCAL_MQTT_PASSWORD', None)
     LOCAL_MQTT_TLS = os.getenv('LOCAL_MQTT_TLS', 'False').lower() == 'true'
-    LOGGING = os.getenv('LOCAL_MQTT_TLS', 'False').lower() == 'true'
+    # 是否输出 INFO 日志，False 时只输出警告和错误
+    LOGGING = os.getenv('LOGGING', 'True').lower() == 'true'
+    # 每帧、每次发布的日志每 N 条输出一条；每个调用位置每秒最多输出的 INFO 日志条数，0 表示不限制
+    LOG_SAMPLE_EVERY = int(os.getenv('LOG_SAMPLE_EVERY', '1'))
+    LOG_RATE_LIMIT = float(os.getenv('LOG_RATE_LIMIT', '20'))
+    # 每隔 N 分钟强制完整发布一次本地状态，0 表示只在变化时发布
+    LOCAL_FORCE_REFRESH_INTERVAL = int(os.getenv('LOCAL_FORCE_REFRESH_INTERVAL', '0'))
+    # 每个属性额外发布到单独的保留主题，开关和单位换算在桥接端算好，实体不再需要模板
+    LOCAL_ATTRIBUTE_TOPICS = os.getenv('LOCAL_ATTRIBUTE_TOPICS', 'False').lower() == 'true'
+    # 场景预设文件(JSON)
+    RINNAI_PRESETS_FILE = os.getenv('RINNAI_PRESETS_FILE', 'presets.json')
+    PRESETS = None
+    LOCAL_TOPIC_PREFIX = "local_mqtt/rinnai"
+    HA_UNIQUE_ID = "rinnai_heater"
+    HA_NODE_ID = "rinnai"
+    HA_DEVICE_NAME = "Rinnai Heater"
 
 
     # Topic structures
@@ -61,15 +144,110 @@ class Config:
 
     @classmethod
     def get_local_topics(cls):
+        return build_local_topics(cls.LOCAL_TOPIC_PREFIX)
+
+    @classmethod
+    def get_attribute_topic(cls, name):
+        return build_attribute_topic(cls.LOCAL_TOPIC_PREFIX, name)
+
+    @classmethod
+    def get_presets(cls):
+        if cls.PRESETS is None:
+            cls.PRESETS = load_presets(cls.RINNAI_PRESETS_FILE)
+        return cls.PRESETS
+
+    @classmethod
+    def is_multi_device(cls):
+        return bool(cls.RINNAI_ACCOUNTS) or cls.RINNAI_ALL_DEVICES
+
+    @classmethod
+    def get_accounts(cls):
+        """返回需要桥接的账号列表 [(http_username, raw_password), ...]"""
+        if cls.RINNAI_ACCOUNTS:
+            return cls.RINNAI_ACCOUNTS
+        return [(cls.RINNAI_HTTP_USERNAME, os.getenv('RINNAI_PASSWORD'))]
+
+
+def build_local_topics(prefix):
+    # 命令主题由实体定义派生
+    topics = entities.command_topics(prefix)
+    topics.update({
+        "presetState": f"{prefix}/preset",
+        "stale": f"{prefix}/stale",
+        "state": f"{prefix}/state",
+        "gas": f"{prefix}/usage/gas",
+        "supplyTime": f"{prefix}/usage/supplyTime",
+        "metrics": f"{prefix}/usage/metrics"
+    })
+    return topics
+
+
+def build_attribute_topic(prefix, name):
+    """LOCAL_ATTRIBUTE_TOPICS 开启时单个属性的保留主题"""
+    return f"{prefix}/attr/{name}"
+
+
+class DeviceConfig:
+    """
+    单台设备的配置。设备相关字段(DEVICE_SN/AUTH_CODE/DEVICE_TYPE/INIT_STATUS、
+    账号、本地主题前缀)保存在实例上，其余配置项回落到全局 Config。
+    """
+
+    def __init__(self, username=None, password=None, device_key=None, device_name=None, base=Config):
+        self.base = base
+        if username:
+            self.RINNAI_HTTP_USERNAME = username
+            self.RINNAI_USERNAME = f"a:rinnai:SR:01:SR:{username}"
+        if password is not None:
+            self.RINNAI_PASSWORD = hash_password(password)
+        # 多设备时用设备 mac 区分本地主题和 Home Assistant 实体
+        if device_key:
+            self.LOCAL_TOPIC_PREFIX = f"{base.LOCAL_TOPIC_PREFIX}/{device_key}"
+            self.HA_UNIQUE_ID = f"{base.HA_UNIQUE_ID}_{device_key}"
+            self.HA_NODE_ID = f"{base.HA_NODE_ID}_{device_key}"
+            self.HA_DEVICE_NAME = f"{base.HA_DEVICE_NAME} {device_name or device_key}"
+        self.DEVICE_SN = None
+        self.AUTH_CODE = None
+        self.DEVICE_TYPE = None
+        self.INIT_STATUS = None
+
+    def __getattr__(self, name):
+        # 只有实例上不存在的属性才会走到这里
+        return getattr(self.base, name)
+
+    def get_rinnai_topics(self):
         return {
-            "hotWaterTempSetting": "local_mqtt/rinnai/set/temp/hotWaterTempSetting",
-            "heatingTempSettingNM": "local_mqtt/rinnai/set/temp/heatingTempSettingNM",
-            "heatingTempSettingHES": "local_mqtt/rinnai/set/temp/heatingTempSettingHES",
-            "energySavingMode": "local_mqtt/rinnai/set/mode/energySavingMode",
-            "outdoorMode": "local_mqtt/rinnai/set/mode/outdoorMode",
-            "rapidHeating": "local_mqtt/rinnai/set/mode/rapidHeating",
-            "summerWinter": "local_mqtt/rinnai/set/mode/summerWinter",
-            "state": "local_mqtt/rinnai/state",
-            "gas": "local_mqtt/rinnai/usage/gas",
-            "supplyTime": "local_mqtt/rinnai/usage/supplyTime"
+            "inf": f"rinnai/SR/01/SR/{self.DEVICE_SN}/inf/",
+            "stg": f"rinnai/SR/01/SR/{self.DEVICE_SN}/stg/",
+            "set": f"rinnai/SR/01/SR/{self.DEVICE_SN}/set/"
         }
+
+    def get_local_topics(self):
+        return build_local_topics(self.LOCAL_TOPIC_PREFIX)
+
+    def get_attribute_topic(self, name):
+        return build_attribute_topic(self.LOCAL_TOPIC_PREFIX, name)
+
+    def update_device_sn(self, device_sn):
+        self.DEVICE_SN = device_sn
+
+    def update_auth_code(self, auth_code):
+        self.AUTH_CODE = auth_code
+
+    def update_device_type(self, device_type):
+        self.DEVICE_TYPE = device_type
+
+    def update_init_status(self, init_status):
+        self.INIT_STATUS = init_status
+
+    def get_snapshot_path(self):
+        return os.path.join(self.RINNAI_CACHE_DIR, f"state_{self.DEVICE_SN}.json")
+
+    def get_capture_path(self):
+        return os.path.join(self.RINNAI_CAPTURE_DIR, f"frames_{self.DEVICE_SN}.bin")
+
+    def update_device_info(self, device_info, init_status=None):
+        self.update_device_sn(device_info.get("mac"))
+        self.update_device_type(device_info.get("deviceType"))
+        self.update_auth_code(device_info.get("authCode"))
+        self.update_init_status(init_status or {})
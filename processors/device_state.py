@@ -0,0 +1,171 @@
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+SECTIONS = ("state", "gas", "supplyTime")
+
+
+class DeviceState(Mapping):
+    """
+    不可变的设备状态快照，用法与原先的 device_data 字典相同(state["gas"] 等)。
+    写入方复制后生成新版本再整体替换，读取方在任何线程拿到的都是一致的视图，不需要加锁。
+    version 只在内容变化时增加，观察者可以据此跳过已处理过的版本。
+    """
+
+    __slots__ = ("version", "stale", "_sections")
+
+    def __init__(self, version: int = 0, sections: Optional[Dict[str, Dict[str, Any]]] = None,
+                 stale: bool = False):
+        if sections is None:
+            sections = {section: {} for section in SECTIONS}
+        self.version = version
+        self.stale = stale
+        self._sections = {name: MappingProxyType(dict(values)) for name, values in sections.items()}
+
+    def __getitem__(self, section: str):
+        return self._sections[section]
+
+    # Mapping 的默认实现走异常路径，热路径上直接委托给字典
+    def get(self, section: str, default=None):
+        return self._sections.get(section, default)
+
+    def __contains__(self, section) -> bool:
+        return section in self._sections
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._sections)
+
+    def __len__(self) -> int:
+        return len(self._sections)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, DeviceState):
+            return self._sections == other._sections
+        return isinstance(other, Mapping) and self._sections == dict(other)
+
+    __hash__ = None
+
+    def evolve(self, working: "Draft", stale: bool) -> "DeviceState":
+        """
+        由 thaw() 得到并修改过的草稿生成下一个版本，没有变化时返回自身。
+        只有值确实变化的 section 才复制一份新字典，其余 section 和只读视图原样沿用。
+        """
+        sections = None
+        for name, values in working.changes():
+            if sections is None:
+                sections = dict(self._sections)
+            sections[name] = MappingProxyType(values)
+        if sections is None:
+            if stale == self.stale:
+                return self
+            sections = self._sections
+        state = DeviceState.__new__(DeviceState)
+        state.version = self.version + 1
+        state.stale = stale
+        state._sections = sections
+        return state
+
+    def thaw(self) -> "Draft":
+        """可修改的草稿，用于生成下一个版本"""
+        return Draft(self)
+
+    def __repr__(self) -> str:
+        return f"DeviceState(version={self.version}, stale={self.stale}, { {name: dict(values) for name, values in self._sections.items()} })"
+
+
+_MISSING = object()
+
+
+class SectionDraft:
+    """
+    草稿中的一个 section。写入与当前值相同时不做任何事，
+    第一次写入不同的值时才复制一份，之后的读写都在副本上进行。
+    """
+
+    __slots__ = ("base", "values")
+
+    def __init__(self, base: Mapping):
+        self.base = base
+        self.values: Optional[Dict[str, Any]] = None
+
+    def _current(self) -> Dict[str, Any]:
+        return self.base if self.values is None else self.values
+
+    def __getitem__(self, key: str):
+        return self._current()[key]
+
+    def get(self, key: str, default=None):
+        return self._current().get(key, default)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._current()
+
+    def __setitem__(self, key: str, value) -> None:
+        if self.values is None:
+            if self.base.get(key, _MISSING) == value:
+                return
+            # mappingproxy.copy() 直接复制底层字典，比 dict(proxy) 逐项读取快
+            self.values = self.base.copy()
+        self.values[key] = value
+
+    def update(self, values) -> None:
+        for key, value in values.items():
+            self[key] = value
+
+    def merged(self) -> Optional[Dict[str, Any]]:
+        """有变化时返回修改后的新字典，否则返回 None"""
+        if self.values is None or self.values == self.base:
+            return None
+        return self.values
+
+
+class Draft:
+    """
+    DeviceState.thaw() 返回的草稿，用法与 device_data 字典相同(working["state"][key] = value)。
+    section 在第一次取出时才包装成 SectionDraft，不复制内容；
+    也可以整体赋值一个新字典(例如能耗指标)，与旧值相同时不算变化。
+    """
+
+    __slots__ = ("state", "sections")
+
+    def __init__(self, state: DeviceState):
+        self.state = state
+        self.sections: Dict[str, Any] = {}
+
+    def __getitem__(self, name: str):
+        section = self.sections.get(name)
+        if section is None:
+            section = self.sections[name] = SectionDraft(self.state._sections[name])
+        return section
+
+    def get(self, name: str, default=None):
+        section = self.sections.get(name)
+        if section is None:
+            base = self.state._sections.get(name)
+            if base is None:
+                return default
+            section = self.sections[name] = SectionDraft(base)
+        return section
+
+    def __setitem__(self, name: str, values: Dict[str, Any]) -> None:
+        self.sections[name] = values
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.sections or name in self.state._sections
+
+    def setdefault(self, name: str, default=None):
+        if name in self:
+            return self[name]
+        self[name] = default
+        return default
+
+    def changes(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """(section, 新字典)，只包含值确实变化的 section"""
+        previous = self.state._sections
+        for name, section in self.sections.items():
+            if isinstance(section, SectionDraft):
+                values = section.merged()
+            else:
+                values = section if previous.get(name) != section else None
+            if values is not None:
+                yield name, values
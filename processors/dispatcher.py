@@ -0,0 +1,91 @@
+import logging
+import threading
+from typing import Callable, Optional
+from utils import metrics
+from .device_state import DeviceState
+
+
+class ObserverDispatcher:
+    """
+    把观察者通知移出林内 paho 网络线程。每个状态快照都包含全部 section 且不可变，
+    本地发布跟不上时只保留最新的快照(各 section 都是 latest-wins)，
+    待分发的数据最多一份，不会无限增长。
+    默认由独立的工作线程分发；asyncio 模式下调用 use_loop 改为在事件循环上分发。
+    """
+
+    def __init__(self, deliver: Callable[[DeviceState], None], name: str = "observer-dispatch"):
+        self.deliver = deliver
+        self.name = name
+        self.pending: Optional[DeviceState] = None
+        self.cond = threading.Condition()
+        self.stopped = False
+        self.loop = None
+        self.scheduled = False
+        self.worker = None
+
+    def submit(self, snapshot: DeviceState) -> None:
+        """快照不可变，直接保存引用后返回，实际通知在工作线程中进行"""
+        with self.cond:
+            if self.stopped:
+                return
+            if self.pending is not None and metrics.ENABLED:
+                metrics.DISPATCH_COALESCED.inc()
+            self.pending = snapshot
+            if self.loop is not None:
+                if not self.scheduled:
+                    self.scheduled = True
+                    self.loop.call_soon_threadsafe(self._drain)
+                return
+            if self.worker is None:
+                self.worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self.worker.start()
+            self.cond.notify()
+
+    def _take(self) -> Optional[DeviceState]:
+        pending, self.pending = self.pending, None
+        return pending
+
+    def _deliver(self, pending: DeviceState) -> None:
+        try:
+            self.deliver(pending)
+        except Exception as e:
+            logging.error(f"Observer dispatch failed: {e}")
+
+    def _run(self) -> None:
+        while True:
+            with self.cond:
+                while self.pending is None and not self.stopped and self.loop is None:
+                    self.cond.wait()
+                if self.pending is None:
+                    # 已停止或已切换到事件循环
+                    return
+                pending = self._take()
+            self._deliver(pending)
+
+    def _drain(self) -> None:
+        with self.cond:
+            self.scheduled = False
+            pending = self._take()
+        if pending is not None:
+            self._deliver(pending)
+
+    def use_loop(self, loop) -> None:
+        """之后在 loop 上分发，工作线程处理完手上的数据后退出"""
+        with self.cond:
+            self.loop = loop
+            worker, self.worker = self.worker, None
+            if self.pending is not None and not self.scheduled:
+                self.scheduled = True
+                loop.call_soon_threadsafe(self._drain)
+            self.cond.notify()
+        if worker is not None:
+            worker.join(timeout=5)
+
+    def stop(self, timeout: float = 5) -> None:
+        """分发完剩余数据后停止"""
+        with self.cond:
+            self.stopped = True
+            worker = self.worker
+            self.cond.notify()
+        if worker is not None:
+            worker.join(timeout)
@@ -0,0 +1,175 @@
+import time
+from typing import Any, Dict, List, Optional
+import utils.constants as const
+from utils.entities import GAS_SCALE
+
+# 视为正在燃烧的 burningState
+BURNING_NAMES = {const.BURNING_STATES["31"], const.BURNING_STATES["32"]}
+# 两帧间隔超过该值时不计入占空比，避免断线期间的状态被当作一直持续
+MAX_FRAME_GAP = 15 * 60
+# 计算燃气流量的最短时间窗口，计数器步进很粗，间隔太短会得到尖峰
+MIN_FLOW_WINDOW = 30
+
+
+class RollingDuty:
+    """
+    固定分桶的滚动窗口占空比。每个桶记录燃烧秒数和有数据覆盖的秒数，
+    维护窗口内的累计值，过期的桶在前进时减掉，不需要重新扫描。
+    """
+
+    def __init__(self, window: float, buckets: int):
+        self.width = window / buckets
+        self.buckets = buckets
+        self.burn = [0.0] * buckets
+        self.covered = [0.0] * buckets
+        self.burn_total = 0.0
+        self.covered_total = 0.0
+        self.current = None  # 当前桶的序号(时间 / 桶宽度)
+
+    def _advance(self, bucket: int) -> None:
+        if self.current is None:
+            self.current = bucket
+            return
+        # 最多清空一轮，跨越很长时间时也是常数开销
+        for index in range(self.current + 1, min(bucket, self.current + self.buckets) + 1):
+            slot = index % self.buckets
+            self.burn_total -= self.burn[slot]
+            self.covered_total -= self.covered[slot]
+            self.burn[slot] = 0.0
+            self.covered[slot] = 0.0
+        self.current = max(self.current, bucket)
+
+    def advance(self, now: float) -> None:
+        """没有数据时也要让过期的桶离开窗口"""
+        self._advance(int(now // self.width))
+
+    def add(self, start: float, end: float, burning: bool) -> None:
+        """把 [start, end) 区间按桶边界拆开计入"""
+        while start < end:
+            bucket = int(start // self.width)
+            segment_end = min(end, (bucket + 1) * self.width)
+            self._advance(bucket)
+            if bucket == self.current:
+                seconds = segment_end - start
+                slot = bucket % self.buckets
+                self.covered[slot] += seconds
+                self.covered_total += seconds
+                if burning:
+                    self.burn[slot] += seconds
+                    self.burn_total += seconds
+            start = segment_end
+
+    def ratio(self) -> Optional[float]:
+        if self.covered_total <= 0:
+            return None
+        return min(1.0, max(0.0, self.burn_total / self.covered_total))
+
+
+class EnergyMetrics:
+    """
+    由原始帧增量计算的派生指标，写入新版本状态的 "metrics" section。
+    每帧只做常数次运算，不保存也不回看历史。
+    """
+
+    def __init__(self):
+        self.duty_windows = {
+            "dutyCycle1h": RollingDuty(3600, 60),
+            "dutyCycle24h": RollingDuty(24 * 3600, 96)
+        }
+        self.last_frame_time: Optional[float] = None
+        self.burning: Optional[bool] = None
+        # 流量计算的起点：gasConsumption 上一次前进(或未燃烧时最近一次上报)的读数和时间
+        self.last_gas: Optional[int] = None
+        self.last_gas_time: Optional[float] = None
+        self.flow_rate = 0.0
+        self.session_start: Optional[float] = None
+        self.session_gas_start: Optional[int] = None
+        self.session_count = 0
+        self.last_session_duration: Optional[float] = None
+        self.last_session_gas: Optional[int] = None
+        # 上次写入 metrics 时的显示值
+        self.last_key = None
+
+    def _gas_reading(self, device_data: Dict[str, Any]) -> Optional[int]:
+        value = (device_data.get("gas") or {}).get("gasConsumption")
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    def _update_flow_rate(self, gas: Optional[int], now: float) -> None:
+        """
+        燃烧期间计数器前进时，按距上次前进的时间计算平均流量。
+        计数器未变的额外 stg 帧不移动起点，不会得到 0 或随后的尖峰
+        """
+        if gas is None:
+            return
+        if (self.last_gas is None or gas < self.last_gas or not self.burning
+                or now - self.last_gas_time > MAX_FRAME_GAP):
+            # 首次读数、计数器回绕、未燃烧或断线太久时只移动起点
+            self.last_gas = gas
+            self.last_gas_time = now
+            return
+        elapsed = now - self.last_gas_time
+        if gas == self.last_gas or elapsed < MIN_FLOW_WINDOW:
+            return
+        # m³/h
+        self.flow_rate = (gas - self.last_gas) / GAS_SCALE / (elapsed / 3600)
+        self.last_gas = gas
+        self.last_gas_time = now
+
+    def _update_sessions(self, burning: bool, gas: Optional[int], now: float) -> None:
+        if burning and not self.burning:
+            self.session_start = now
+            self.session_gas_start = gas
+        elif not burning and self.burning and self.session_start is not None:
+            self.session_count += 1
+            self.last_session_duration = now - self.session_start
+            if gas is not None and self.session_gas_start is not None:
+                self.last_session_gas = max(0, gas - self.session_gas_start)
+            self.session_start = None
+        if not burning:
+            self.flow_rate = 0.0
+
+    def update(self, device_data: Dict[str, Any], topic_kind: str, now: Optional[float] = None) -> None:
+        """topic_kind 为 inf 或 stg，gasConsumption 只在 stg 帧中更新"""
+        now = time.monotonic() if now is None else now
+        burning_state = (device_data.get("state") or {}).get("burningState")
+        burning = burning_state in BURNING_NAMES if burning_state is not None else self.burning
+        gas = self._gas_reading(device_data)
+
+        if self.last_frame_time is not None and self.burning is not None:
+            gap_ok = now - self.last_frame_time <= MAX_FRAME_GAP
+            for window in self.duty_windows.values():
+                if gap_ok:
+                    window.add(self.last_frame_time, now, self.burning)
+                else:
+                    window.advance(now)
+        self.last_frame_time = now
+
+        if burning is not None:
+            self._update_sessions(burning, gas, now)
+            self.burning = burning
+        if topic_kind == 'stg':
+            self._update_flow_rate(gas, now)
+
+        # 显示精度下没有变化时不重新生成，草稿中沿用上一版本的 metrics
+        duty = [round((window.ratio() or 0) * 100, 1) for window in self.duty_windows.values()]
+        key = (round(self.flow_rate, 4), self.session_count, self.last_session_duration,
+               self.last_session_gas, *duty)
+        if key != self.last_key:
+            self.last_key = key
+            device_data["metrics"] = self.as_dict(duty)
+
+    def as_dict(self, duty: Optional[List[float]] = None) -> Dict[str, str]:
+        if duty is None:
+            duty = [(window.ratio() or 0) * 100 for window in self.duty_windows.values()]
+        metrics = {
+            "gasFlowRate": f"{self.flow_rate:.4f}",
+            "burnSessions": str(self.session_count),
+            "lastBurnDuration": f"{(self.last_session_duration or 0) / 60:.1f}",
+            "lastBurnGas": f"{(self.last_session_gas or 0) / GAS_SCALE:.4f}"
+        }
+        for name, ratio in zip(self.duty_windows, duty):
+            metrics[name] = f"{ratio:.1f}"
+        return metrics
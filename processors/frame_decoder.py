@@ -0,0 +1,90 @@
+import logging
+from typing import Any, Callable, Dict, Tuple
+from utils.device_schemas import get_schema
+
+
+def _hex_converter(spec: Dict[str, Any]) -> Callable[[str], str]:
+    return lambda value: str(int(value, 16))
+
+
+def _enum_converter(spec: Dict[str, Any]) -> Callable[[str], str]:
+    table = spec["table"]
+    return lambda value: table.get(value, f"invalid ({value})")
+
+
+def _scaled_converter(spec: Dict[str, Any]) -> Callable[[str], str]:
+    scale = spec["scale"]
+    digits = spec.get("digits", 2)
+    return lambda value: str(round(int(value, 16) * scale, digits))
+
+
+CONVERTERS = {
+    "hex": _hex_converter,
+    "enum": _enum_converter,
+    "scaled": _scaled_converter
+}
+
+# 预编译表: 参数 id -> (section, 转换函数)
+DecodeTable = Dict[str, Tuple[str, Callable[[str], str]]]
+
+
+def compile_table(params: Dict[str, Dict[str, Any]], default_section: str) -> DecodeTable:
+    table = {}
+    for param_id, spec in params.items():
+        converter = CONVERTERS.get(spec["type"])
+        if converter is None:
+            raise ValueError(f"Unknown parameter type for {param_id}: {spec['type']}")
+        table[param_id] = (spec.get("section", default_section), converter(spec))
+    return table
+
+
+class FrameDecoder:
+    """由设备 schema 编译而成的解码器，解码时只需查预先生成的表"""
+
+    def __init__(self, schema: Dict[str, Any]):
+        self.model = schema.get("model")
+        self.inf_table = compile_table(schema.get("inf", {}), "state")
+        self.stg_table = compile_table(schema.get("stg", {}), "supplyTime")
+
+    def decode_info(self, parsed_data: Dict[str, Any], device_data: Dict[str, Dict[str, str]]) -> None:
+        """解码 inf 帧的 enl 列表"""
+        table = self.inf_table
+        for param in parsed_data.get('enl', []):
+            param_id = param.get('id')
+            param_data = param.get('data')
+            entry = table.get(param_id)
+            if entry is None or not param_data:
+                continue
+            section, convert = entry
+            try:
+                device_data[section][param_id] = convert(param_data)
+            except ValueError:
+                logging.error(f"Error processing parameter {param_id}: invalid value {param_data}")
+
+    def decode_energy(self, parsed_data: Dict[str, Any], device_data: Dict[str, Dict[str, str]]) -> None:
+        """解码 stg 帧的 egy 列表"""
+        table = self.stg_table
+        for param in parsed_data.get('egy', []):
+            if not isinstance(param, dict):
+                logging.warning(f"Skipping invalid parameter entry: {param}")
+                continue
+            for key, value in param.items():
+                entry = table.get(key)
+                if entry is None or not value:
+                    continue
+                section, convert = entry
+                try:
+                    device_data[section][key] = convert(value)
+                except ValueError:
+                    logging.warning(f"Invalid hex value for {key}: {value}")
+
+
+_decoders: Dict[Any, FrameDecoder] = {}
+
+
+def get_decoder(device_type=None) -> FrameDecoder:
+    """每种设备型号只编译一次解码器"""
+    decoder = _decoders.get(device_type)
+    if decoder is None:
+        decoder = _decoders[device_type] = FrameDecoder(get_schema(device_type))
+    return decoder
@@ -0,0 +1,152 @@
+import time
+import threading
+from array import array
+from typing import Dict, List, Optional, Tuple
+from .message_processor import DeviceDataObserver
+
+# 记录历史的计数器所在的 section
+COUNTER_SECTIONS = ("gas", "supplyTime")
+
+# 降采样层级: (名称, 桶宽度秒数)，raw 不降采样
+TIERS = (("raw", None), ("minute", 60), ("hour", 3600))
+
+
+class RingBuffer:
+    """定长的 (时间戳, 值) 环形缓冲区，底层是预分配的 array('d')，内存占用固定"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.timestamps = array('d', bytes(8 * capacity))
+        self.values = array('d', bytes(8 * capacity))
+        self.start = 0
+        self.count = 0
+
+    def append(self, timestamp: float, value: float) -> None:
+        index = (self.start + self.count) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+        else:
+            # 已满，覆盖最旧的样本
+            self.start = (self.start + 1) % self.capacity
+        self.timestamps[index] = timestamp
+        self.values[index] = value
+
+    def _timestamp_at(self, i: int) -> float:
+        return self.timestamps[(self.start + i) % self.capacity]
+
+    def _bisect(self, timestamp: float, right: bool) -> int:
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            ts = self._timestamp_at(mid)
+            if ts < timestamp or (right and ts == timestamp):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def oldest(self) -> Optional[float]:
+        return self._timestamp_at(0) if self.count else None
+
+    def last_timestamp(self) -> Optional[float]:
+        return self._timestamp_at(self.count - 1) if self.count else None
+
+    def range(self, start: float, end: float) -> List[Tuple[float, float]]:
+        """返回 start <= 时间戳 <= end 的样本，时间戳有序所以用二分查找"""
+        first = self._bisect(start, right=False)
+        last = self._bisect(end, right=True)
+        samples = []
+        for i in range(first, last):
+            index = (self.start + i) % self.capacity
+            samples.append((self.timestamps[index], self.values[index]))
+        return samples
+
+
+class TieredSeries:
+    """一个计数器的历史：原始样本加按分钟、按小时降采样的层级(每个桶取最后一个值)"""
+
+    def __init__(self, sizes: Dict[str, int]):
+        self.tiers = {name: RingBuffer(sizes[name]) for name, _ in TIERS}
+        # 尚未结束的桶: 层级名 -> (桶开始时间, 最后一个值)
+        self.open_buckets: Dict[str, Tuple[float, float]] = {}
+
+    def add(self, timestamp: float, value: float) -> None:
+        raw = self.tiers["raw"]
+        last = raw.last_timestamp()
+        if last is not None and timestamp < last:
+            # 系统时间回拨时保持时间戳单调
+            timestamp = last
+        raw.append(timestamp, value)
+        for name, width in TIERS[1:]:
+            bucket = timestamp - timestamp % width
+            current = self.open_buckets.get(name)
+            if current is not None and current[0] != bucket:
+                self.tiers[name].append(*current)
+            self.open_buckets[name] = (bucket, value)
+
+    def select_tier(self, start: float) -> str:
+        """覆盖 start 的最细层级，都不覆盖时用最粗的层级"""
+        for name, _ in TIERS:
+            oldest = self.tiers[name].oldest()
+            if oldest is not None and oldest <= start:
+                return name
+        return TIERS[-1][0]
+
+    def query(self, start: float, end: float, tier: Optional[str] = None):
+        tier = tier or self.select_tier(start)
+        samples = self.tiers[tier].range(start, end)
+        bucket = self.open_buckets.get(tier)
+        if bucket is not None and start <= bucket[0] <= end:
+            samples.append(bucket)
+        return tier, samples
+
+
+class HistoryStore(DeviceDataObserver):
+    """
+    gas/supplyTime 计数器的内存历史。只在值变化时记录样本，
+    每个计数器的内存占用由各层级的容量决定。
+    启动时载入的快照(stale)不是新样本，只作为判断变化的起点。
+    """
+
+    def __init__(self, sizes: Dict[str, int]):
+        self.sizes = sizes
+        self.series: Dict[str, TieredSeries] = {}
+        self.last_values: Dict[str, str] = {}
+        self.lock = threading.Lock()
+        self.last_version = None
+
+    def update(self, device_data) -> None:
+        if device_data.version == self.last_version:
+            return
+        now = time.time()
+        with self.lock:
+            self.last_version = device_data.version
+            for section in COUNTER_SECTIONS:
+                for key, value in (device_data.get(section) or {}).items():
+                    if self.last_values.get(key) == value:
+                        continue
+                    self.last_values[key] = value
+                    if device_data.stale:
+                        continue
+                    try:
+                        number = float(value)
+                    except (TypeError, ValueError):
+                        continue
+                    series = self.series.get(key)
+                    if series is None:
+                        series = self.series[key] = TieredSeries(self.sizes)
+                    series.add(now, number)
+
+    def counters(self) -> List[str]:
+        with self.lock:
+            return list(self.series)
+
+    def query(self, counter: str, start: Optional[float] = None, end: Optional[float] = None,
+              tier: Optional[str] = None):
+        """返回 (层级, [(时间戳, 值), ...])，计数器不存在时抛出 KeyError"""
+        if tier is not None and tier not in self.sizes:
+            raise ValueError(f"Unknown history tier: {tier}")
+        end = time.time() if end is None else end
+        start = 0 if start is None else start
+        with self.lock:
+            return self.series[counter].query(start, end, tier)
@@ -1,123 +1,124 @@
-import json
+import time
 import logging
-from typing import Dict, Any, List
-import utils.constants as const
+import threading
+from typing import Callable, Dict, Any, List, Optional
+from utils import json_codec, metrics
+from .frame_decoder import get_decoder
+from .energy_metrics import EnergyMetrics
+from .dispatcher import ObserverDispatcher
+from .device_state import DeviceState
 
 
 class DeviceDataObserver:
-    def update(self, device_data: Dict[str, Any]) -> None:
+    def update(self, device_data: DeviceState) -> None:
         pass
 
 
 class MessageProcessor:
-    def __init__(self):
-        self.device_data = {
-            "state": {},
-            "gas": {},
-            "supplyTime": {}
-        }
+    def __init__(self, device_type=None, dispatch_queue=False):
+        self.decoder = get_decoder(device_type)
+        # 当前的不可变快照，只能通过 update_state 整体替换
+        self.device_data = DeviceState()
+        self.write_lock = threading.Lock()
+        # 等待确认的命令，由 CommandTracker 设置
+        self.command_tracker = None
+        # 派生的能耗指标，每帧增量更新
+        self.energy_metrics = EnergyMetrics()
         self.observers: List[DeviceDataObserver] = []
+        # 设置后观察者在分发线程中收到数据的副本，不阻塞林内网络线程
+        self.dispatcher = ObserverDispatcher(self.deliver) if dispatch_queue else None
+
+    @property
+    def stale(self) -> bool:
+        """数据来自磁盘快照、尚未收到云端数据时为 True"""
+        return self.device_data.stale
 
     def register_observer(self, observer: DeviceDataObserver) -> None:
         self.observers.append(observer)
 
-    def notify_observers(self) -> None:
+    def update_state(self, mutate: Callable[..., None], *args,
+                     stale: Optional[bool] = None, notify: bool = True) -> DeviceState:
+        """
+        以当前快照的草稿调用 mutate(working, *args)，内容有变化时生成新版本并替换。
+        草稿只复制实际修改的 section，写入方之间用锁串行，读取方直接读 device_data。
+        """
+        with self.write_lock:
+            current = self.device_data
+            working = current.thaw()
+            mutate(working, *args)
+            snapshot = self.device_data = current.evolve(
+                working, current.stale if stale is None else stale)
+        if notify:
+            self.notify_observers(snapshot)
+        return snapshot
+
+    def notify_observers(self, snapshot: Optional[DeviceState] = None) -> None:
+        snapshot = snapshot or self.device_data
+        if self.dispatcher is not None:
+            self.dispatcher.submit(snapshot)
+        else:
+            self.deliver(snapshot)
+
+    def deliver(self, device_data: DeviceState) -> None:
+        start = time.perf_counter() if metrics.ENABLED else None
         for observer in self.observers:
-            observer.update(self.device_data)
-
-    def _process_hex_value(self, value: str, param_name: str) -> str:
-        """Convert hex value to decimal string."""
-        try:
-            return str(int(value, 16))
-        except ValueError as e:
-            logging.warning(f"Invalid hex value for {param_name}: {value}")
-            raise ValueError(
-                f"Invalid hex value for {param_name}: {value}") from e
-
-    def _get_operation_mode(self, mode_code: str) -> str:
-        mode_mapping = const.OPERATION_MODES
-        return mode_mapping.get(mode_code, f"invalid ({mode_code})")
-
-    def _get_burning_state(self, state_code: str) -> str:
-        state_mapping = const.BURNING_STATES
-        return state_mapping.get(state_code, f"invalid ({state_code})")
-
-    def _process_device_info(self, parsed_data: Dict[str, Any]) -> None:
-        """Process device information from parsed message."""
-        state_mapping = {
-            'operationMode': self._get_operation_mode,
-            'roomTempControl': lambda x: self._process_hex_value(x, 'roomTempControl'),
-            'heatingOutWaterTempControl': lambda x: self._process_hex_value(x, 'heatingOutWaterTempControl'),
-            'burningState': self._get_burning_state,
-            'hotWaterTempSetting': lambda x: self._process_hex_value(x, 'hotWaterTempSetting'),
-            'heatingTempSettingNM': lambda x: self._process_hex_value(x, 'heatingTempSettingNM'),
-            'heatingTempSettingHES': lambda x: self._process_hex_value(x, 'heatingTempSettingHES')
-        }
-
-        for param in parsed_data.get('enl', []):
-            try:
-                param_id = param.get('id')
-                param_data = param.get('data')
-
-                if not param_id or not param_data:
-                    continue
-
-                if param_id in state_mapping:
-                    self.device_data["state"][param_id] = state_mapping[param_id](
-                        param_data)
-
-            except Exception as e:
-                logging.error(f"Error processing parameter {param_id}: {e}")
-
-    def _process_energy_data(self, parsed_data: Dict[str, Any]) -> None:
-        """Process energy consumption data."""
-        time_parameters = const.TIME_PARAMETERS
-
-        for param in parsed_data.get('egy', []):
-            if not isinstance(param, dict):
-                logging.warning(f"Skipping invalid parameter entry: {param}")
-                continue
-
-            # Process gas consumption
-            if gas_value := param.get('gasConsumption'):
-                try:
-                    self.device_data["gas"]["gasConsumption"] = self._process_hex_value(
-                        gas_value, 'gasConsumption')
-                except ValueError:
-                    continue
-
-            # Process time-related parameters
-            for key in param.keys() & time_parameters:
-                try:
-                    self.device_data["supplyTime"][key] = self._process_hex_value(
-                        param[key], key)
-                except ValueError:
-                    logging.warning(f"Failed to process {key}")
-                    continue
+            observer.update(device_data)
+        if start is not None:
+            metrics.FANOUT_SECONDS.observe(time.perf_counter() - start)
+
+    def load_snapshot(self, snapshot: Dict[str, Dict[str, Any]]) -> None:
+        """用上次保存的状态预先填充 device_data，标记为过期直到收到云端数据"""
+        def merge(working):
+            for section, values in snapshot.items():
+                working.setdefault(section, {}).update(values)
+        self.update_state(merge, stale=True)
+
+    def apply_device_info(self, parsed_data: Dict[str, Any], stale: Optional[bool] = None) -> DeviceState:
+        """把 enl 格式的参数写入 state，例如 processParameter 返回的初始状态"""
+        return self.update_state(lambda working: self.decoder.decode_info(parsed_data, working), stale=stale)
+
+    def _timed_decode(self, topic_kind: str, decode, parsed_data: Dict[str, Any],
+                      working: Dict[str, Dict[str, Any]]) -> None:
+        if not metrics.ENABLED:
+            decode(parsed_data, working)
+            return
+        start = time.perf_counter()
+        decode(parsed_data, working)
+        metrics.DECODE_SECONDS.observe(time.perf_counter() - start, topic_kind)
+
+    def process_frame(self, topic_kind: str, parsed_data: Dict[str, Any]) -> None:
+        """Process an already parsed frame; topic_kind is inf/stg/set."""
+        if not parsed_data or not topic_kind:
+            logging.warning("Received invalid or empty message")
+            return
+
+        if (topic_kind == 'inf' and
+            parsed_data.get('enl') and
+                parsed_data.get('code') == "FFFF"):
+            # Notify observers after processing device info
+            self.update_state(self._apply_info, topic_kind, parsed_data, stale=False)
+
+        elif (topic_kind == 'stg' and
+                parsed_data.get('egy') and
+                parsed_data.get('ptn') == "J05"):
+            # Notify observers after processing energy data
+            self.update_state(self._apply_energy, topic_kind, parsed_data, stale=False)
+
+    def _apply_info(self, working, topic_kind: str, parsed_data: Dict[str, Any]) -> None:
+        self._timed_decode(topic_kind, self.decoder.decode_info, parsed_data, working)
+        if self.command_tracker:
+            self.command_tracker.reconcile(parsed_data, working["state"])
+        self.energy_metrics.update(working, topic_kind)
+
+    def _apply_energy(self, working, topic_kind: str, parsed_data: Dict[str, Any]) -> None:
+        self._timed_decode(topic_kind, self.decoder.decode_energy, parsed_data, working)
+        self.energy_metrics.update(working, topic_kind)
 
     def process_message(self, msg):
         """Process incoming Rinnai device messages."""
         try:
-            parsed_data = json.loads(msg.payload.decode('utf-8'))
-            parsed_topic = msg.topic.split('/')[-2]
-
-            if not parsed_data or not parsed_topic:
-                logging.warning("Received invalid or empty message")
-                return
-
-            if (parsed_topic == 'inf' and
-                parsed_data.get('enl') and
-                    parsed_data.get('code') == "FFFF"):
-                self._process_device_info(parsed_data)
-                self.notify_observers()  # Notify observers after processing device info
-
-            elif (parsed_topic == 'stg' and
-                    parsed_data.get('egy') and
-                    parsed_data.get('ptn') == "J05"):
-                self._process_energy_data(parsed_data)
-                self.notify_observers()  # Notify observers after processing energy data
-
-        except json.JSONDecodeError:
+            self.process_frame(msg.topic.split('/')[-2], json_codec.loads(msg.payload))
+        except json_codec.JSONDecodeError:
             logging.error("Failed to parse JSON message")
         except Exception as e:
             logging.error(f"Unexpected error in message processing: {e}")
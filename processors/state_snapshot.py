@@ -0,0 +1,46 @@
+import os
+import json
+import logging
+from typing import Any, Dict, Optional
+from utils.atomic_file import write_json_atomic
+from .message_processor import DeviceDataObserver
+
+SNAPSHOT_SECTIONS = ("state", "gas", "supplyTime")
+
+
+class StateSnapshot(DeviceDataObserver):
+    """
+    把 device_data 的最新内容保存到磁盘，重启后先发布上次的状态。
+    内容没有变化时不写文件。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.last_written: Optional[Dict[str, Any]] = None
+        self.last_version = None
+
+    def load(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Failed to read state snapshot {self.path}: {e}")
+            return None
+        data = {section: dict(data.get(section) or {}) for section in SNAPSHOT_SECTIONS}
+        self.last_written = data
+        return data
+
+    def update(self, device_data) -> None:
+        if device_data.version == self.last_version:
+            return
+        self.last_version = device_data.version
+        data = {section: dict(device_data.get(section) or {}) for section in SNAPSHOT_SECTIONS}
+        if data == self.last_written:
+            return
+        try:
+            write_json_atomic(self.path, data)
+            self.last_written = data
+        except OSError as e:
+            logging.warning(f"Failed to write state snapshot {self.path}: {e}")
@@ -0,0 +1,133 @@
+"""
+把 RINNAI_CAPTURE_DIR 记录的帧回放到 MessageProcessor/LocalClient，发布到本地 broker。
+
+    python replay.py frames_XXXX.bin.1 frames_XXXX.bin            # 按原始间隔
+    python replay.py frames_XXXX.bin --speed 10                   # 10 倍速
+    python replay.py frames_XXXX.bin --fast                       # 不等待
+    python replay.py frames_XXXX.bin --fast --no-publish          # 只压测处理路径
+
+轮转出的文件按时间顺序(编号大的在前)传入。回放时本地下发的命令只记录日志，不会发往林内云端。
+"""
+import time
+import logging
+import argparse
+from config import Config, DeviceConfig
+from clients.local_client import LocalClient
+from clients.local_connection import LocalConnection
+from processors.message_processor import MessageProcessor
+from utils.frame_log import read_frames
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ReplayMessage:
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+
+class _IgnoredBatcher:
+    def send_now(self, params):
+        logger.info(f"Replay: ignoring command {params}")
+
+
+class ReplayRinnaiClient:
+    """代替 RinnaiClient，回放时不连接林内云端"""
+
+    def __init__(self, message_processor):
+        self.message_processor = message_processor
+        self.command_batcher = _IgnoredBatcher()
+
+    def set_temperature(self, heat_type, temperature):
+        logger.info(f"Replay: ignoring {heat_type} = {temperature}")
+
+    def set_mode(self, mode):
+        logger.info(f"Replay: ignoring mode switch {mode}")
+
+    def send_command(self, topic, payload):
+        logger.info(f"Replay: ignoring command {topic} {payload}")
+
+
+class _CountingClient:
+    """--no-publish 时代替 paho 客户端"""
+
+    def __init__(self):
+        self.publishes = 0
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self.publishes += 1
+
+    def subscribe(self, topics):
+        return 0, 0
+
+
+class _OfflineConnection:
+    def __init__(self):
+        self.client = _CountingClient()
+
+    def attach(self, device_client):
+        pass
+
+
+def replay(paths, processor, speed=1.0, fast=False):
+    """按记录的时间间隔除以 speed 回放，fast 时不等待。返回回放的帧数"""
+    count = 0
+    first_timestamp = None
+    started = time.monotonic()
+    for path in paths:
+        for timestamp, topic, payload in read_frames(path):
+            if first_timestamp is None:
+                first_timestamp = timestamp
+            if not fast:
+                # 相对起点计算，避免逐帧 sleep 的误差累积
+                delay = (timestamp - first_timestamp) / speed - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            processor.process_message(ReplayMessage(topic, payload))
+            count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay captured Rinnai frames")
+    parser.add_argument("paths", nargs="+", help="capture files, oldest first")
+    parser.add_argument("--speed", type=float, default=1.0, help="speed multiplier (default 1)")
+    parser.add_argument("--fast", action="store_true", help="replay as fast as possible")
+    parser.add_argument("--device-type", default=None, help="device type used to decode frames")
+    parser.add_argument("--device-key", default=None,
+                        help="publish under local_mqtt/rinnai/<key> like multi-device mode")
+    parser.add_argument("--no-publish", action="store_true",
+                        help="do not connect to the local broker, only count publishes")
+    args = parser.parse_args(argv)
+
+    config = DeviceConfig(device_key=args.device_key, base=Config)
+    config.update_device_type(args.device_type)
+    processor = MessageProcessor(args.device_type)
+
+    if args.no_publish:
+        connection = _OfflineConnection()
+        logging.disable(logging.INFO)
+    else:
+        connection = LocalConnection(config)
+    LocalClient(config, ReplayRinnaiClient(processor), connection)
+
+    if not args.no_publish:
+        connection.connect(config.LOCAL_MQTT_HOST, config.LOCAL_MQTT_PORT)
+        connection.start()
+    started = time.perf_counter()
+    try:
+        count = replay(args.paths, processor, args.speed, args.fast)
+    finally:
+        if not args.no_publish:
+            connection.stop()
+    elapsed = time.perf_counter() - started
+    logging.disable(logging.NOTSET)
+    logger.info(f"Replayed {count} frame(s) in {elapsed:.3f}s "
+                f"({count / elapsed if elapsed else 0:.0f} frames/s)")
+    if args.no_publish:
+        logger.info(f"Local publishes: {connection.client.publishes}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+"""
+本地林内云端模拟器：HTTP 接口、精简的 MQTT broker 和 G56 设备状态机，
+用于在没有外部服务的情况下做端到端测试。用法见 simulator/__main__.py。
+"""
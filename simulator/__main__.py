@@ -0,0 +1,60 @@
+"""
+启动模拟器后，桥接程序使用以下环境变量连接到模拟器:
+
+    RINNAI_HTTP_HOST=http://127.0.0.1:8080/app
+    RINNAI_HOST=127.0.0.1
+    RINNAI_PORT=1884
+    RINNAI_TLS=False
+    RINNAI_ALL_DEVICES=True     # 模拟多台设备时
+
+    python -m simulator --devices 20 --inf-delay 0.2 --stg-delay 0.5
+
+任意用户名和密码都能登录，所有模拟设备都在同一个账号下。
+"""
+import asyncio
+import logging
+import argparse
+from .cloud import SimulatedCloud
+from .device import SimulatedG56
+from .http_api import start_http_api
+
+
+def build_devices(count):
+    return [SimulatedG56(f"SIM{index:09X}", f"AUTH{index:04d}", 1000 + index, seed=index)
+            for index in range(1, count + 1)]
+
+
+async def serve(args):
+    devices = build_devices(args.devices)
+    http_server = start_http_api(args.host, args.http_port, devices, args.http_delay)
+    cloud = SimulatedCloud(devices, args.inf_delay, args.stg_delay, args.push_interval)
+    await cloud.start(args.host, args.mqtt_port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        cloud.broker.close()
+        http_server.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local Rinnai cloud simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--http-port", type=int, default=8080)
+    parser.add_argument("--mqtt-port", type=int, default=1884)
+    parser.add_argument("--devices", type=int, default=1)
+    parser.add_argument("--inf-delay", type=float, default=0.2, help="seconds before the inf reply")
+    parser.add_argument("--stg-delay", type=float, default=0.5, help="seconds before the stg reply")
+    parser.add_argument("--http-delay", type=float, default=0.0, help="added latency per HTTP request")
+    parser.add_argument("--push-interval", type=float, default=60.0,
+                        help="seconds between unsolicited reports, 0 to disable")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
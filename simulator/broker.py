@@ -0,0 +1,182 @@
+"""
+只实现桥接程序用到的 MQTT 3.1.1 子集的 asyncio broker:
+CONNECT/SUBSCRIBE/UNSUBSCRIBE/PUBLISH(QoS 0/1/2)/PINGREQ/DISCONNECT，不支持保留消息和会话。
+进程内可以用 add_handler 监听主题、用 publish 发布消息。
+"""
+import asyncio
+import struct
+import logging
+from typing import Callable, Dict, List, Tuple
+
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    filter_parts = topic_filter.split('/')
+    topic_parts = topic.split('/')
+    for index, part in enumerate(filter_parts):
+        if part == '#':
+            return True
+        if index >= len(topic_parts):
+            return False
+        if part != '+' and part != topic_parts[index]:
+            return False
+    return len(filter_parts) == len(topic_parts)
+
+
+def encode_length(length: int) -> bytes:
+    encoded = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(encoded)
+
+
+def encode_string(value: str) -> bytes:
+    data = value.encode('utf-8')
+    return struct.pack('!H', len(data)) + data
+
+
+def packet(packet_type: int, flags: int, body: bytes) -> bytes:
+    return bytes([packet_type << 4 | flags]) + encode_length(len(body)) + body
+
+
+class Session:
+    def __init__(self, broker, reader, writer):
+        self.broker = broker
+        self.reader = reader
+        self.writer = writer
+        self.client_id = None
+        self.subscriptions = set()
+
+    def send(self, data: bytes) -> None:
+        if not self.writer.is_closing():
+            self.writer.write(data)
+
+    async def read_packet(self) -> Tuple[int, int, bytes]:
+        first = await self.reader.readexactly(1)
+        multiplier, length = 1, 0
+        while True:
+            byte = (await self.reader.readexactly(1))[0]
+            length += (byte & 0x7F) * multiplier
+            if not byte & 0x80:
+                break
+            multiplier *= 128
+        body = await self.reader.readexactly(length) if length else b''
+        return first[0] >> 4, first[0] & 0x0F, body
+
+    def handle_connect(self, body: bytes) -> None:
+        # 协议名、版本、标志、keepalive 之后是 client id
+        name_length = struct.unpack('!H', body[:2])[0]
+        offset = 2 + name_length + 4
+        id_length = struct.unpack('!H', body[offset:offset + 2])[0]
+        self.client_id = body[offset + 2:offset + 2 + id_length].decode('utf-8', 'replace')
+        self.send(packet(CONNACK, 0, b'\x00\x00'))
+        logging.debug(f"Simulator broker: {self.client_id} connected")
+
+    def handle_subscribe(self, body: bytes) -> None:
+        packet_id = body[:2]
+        offset, granted, topics = 2, bytearray(), []
+        while offset < len(body):
+            length = struct.unpack('!H', body[offset:offset + 2])[0]
+            topic_filter = body[offset + 2:offset + 2 + length].decode('utf-8')
+            qos = body[offset + 2 + length]
+            offset += 3 + length
+            self.subscriptions.add(topic_filter)
+            topics.append(topic_filter)
+            granted.append(min(qos, 1))
+        self.send(packet(SUBACK, 0, packet_id + bytes(granted)))
+        for topic_filter in topics:
+            self.broker.on_subscribe(self, topic_filter)
+
+    def handle_unsubscribe(self, body: bytes) -> None:
+        offset = 2
+        while offset < len(body):
+            length = struct.unpack('!H', body[offset:offset + 2])[0]
+            self.subscriptions.discard(body[offset + 2:offset + 2 + length].decode('utf-8'))
+            offset += 2 + length
+        self.send(packet(UNSUBACK, 0, body[:2]))
+
+    def handle_publish(self, flags: int, body: bytes) -> None:
+        qos = (flags >> 1) & 0x03
+        length = struct.unpack('!H', body[:2])[0]
+        topic = body[2:2 + length].decode('utf-8')
+        offset = 2 + length
+        if qos:
+            packet_id = body[offset:offset + 2]
+            offset += 2
+            self.send(packet(PUBACK if qos == 1 else PUBREC, 0, packet_id))
+        self.broker.publish(topic, body[offset:])
+
+    async def run(self) -> None:
+        try:
+            while True:
+                packet_type, flags, body = await self.read_packet()
+                if packet_type == CONNECT:
+                    self.handle_connect(body)
+                elif packet_type == PUBLISH:
+                    self.handle_publish(flags, body)
+                elif packet_type == PUBREL:
+                    self.send(packet(PUBCOMP, 0, body[:2]))
+                elif packet_type == SUBSCRIBE:
+                    self.handle_subscribe(body)
+                elif packet_type == UNSUBSCRIBE:
+                    self.handle_unsubscribe(body)
+                elif packet_type == PINGREQ:
+                    self.send(packet(PINGRESP, 0, b''))
+                elif packet_type == DISCONNECT:
+                    break
+                await self.writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.broker.sessions.discard(self)
+            self.writer.close()
+            logging.debug(f"Simulator broker: {self.client_id} disconnected")
+
+
+class MiniBroker:
+    def __init__(self):
+        self.sessions = set()
+        self.handlers: List[Tuple[str, Callable[[str, bytes], None]]] = []
+        self.subscribe_handlers: List[Tuple[str, Callable[[str], None]]] = []
+        self.server = None
+
+    def add_handler(self, topic_filter: str, callback: Callable[[str, bytes], None]) -> None:
+        """进程内订阅，callback(topic, payload)"""
+        self.handlers.append((topic_filter, callback))
+
+    def add_subscribe_handler(self, topic_filter: str, callback: Callable[[str], None]) -> None:
+        """客户端订阅匹配的主题时调用 callback(topic_filter)"""
+        self.subscribe_handlers.append((topic_filter, callback))
+
+    def on_subscribe(self, session: Session, topic_filter: str) -> None:
+        for pattern, callback in self.subscribe_handlers:
+            if topic_matches(pattern, topic_filter):
+                callback(topic_filter)
+
+    def publish(self, topic: str, payload: bytes) -> None:
+        data = None
+        for session in list(self.sessions):
+            if any(topic_matches(topic_filter, topic) for topic_filter in session.subscriptions):
+                if data is None:
+                    data = packet(PUBLISH, 0, encode_string(topic) + payload)
+                session.send(data)
+        for topic_filter, callback in self.handlers:
+            if topic_matches(topic_filter, topic):
+                callback(topic, payload)
+
+    async def _accept(self, reader, writer) -> None:
+        session = Session(self, reader, writer)
+        self.sessions.add(session)
+        await session.run()
+
+    async def start(self, host: str, port: int) -> None:
+        self.server = await asyncio.start_server(self._accept, host, port)
+        logging.info(f"Simulator MQTT broker listening on {host}:{port}")
+
+    def close(self) -> None:
+        if self.server:
+            self.server.close()
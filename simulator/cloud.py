@@ -0,0 +1,74 @@
+"""把模拟设备挂到 broker 上：应答 J00 set 帧、订阅时推送当前状态、定时上报"""
+import time
+import asyncio
+import logging
+from typing import Dict, List
+from utils import json_codec
+from .broker import MiniBroker
+from .device import SimulatedG56
+
+TOPIC_PREFIX = "rinnai/SR/01/SR"
+
+
+class SimulatedCloud:
+    def __init__(self, devices: List[SimulatedG56], inf_delay=0.2, stg_delay=0.5, push_interval=60.0):
+        self.devices: Dict[str, SimulatedG56] = {device.mac: device for device in devices}
+        self.inf_delay = inf_delay
+        self.stg_delay = stg_delay
+        self.push_interval = push_interval
+        self.broker = MiniBroker()
+        self.broker.add_handler(f"{TOPIC_PREFIX}/+/set/", self.on_set)
+        self.broker.add_subscribe_handler(f"{TOPIC_PREFIX}/+/inf/", self.on_subscribe)
+        self.loop = None
+        self.last_tick = time.monotonic()
+
+    @staticmethod
+    def _mac(topic: str) -> str:
+        return topic.split('/')[4]
+
+    def publish_inf(self, device: SimulatedG56) -> None:
+        self.broker.publish(f"{TOPIC_PREFIX}/{device.mac}/inf/", json_codec.dumps(device.inf_frame()).encode())
+
+    def publish_stg(self, device: SimulatedG56) -> None:
+        self.broker.publish(f"{TOPIC_PREFIX}/{device.mac}/stg/", json_codec.dumps(device.stg_frame()).encode())
+
+    def respond(self, device: SimulatedG56) -> None:
+        """按配置的延迟依次应答 inf 和 stg"""
+        self.loop.call_later(self.inf_delay, self.publish_inf, device)
+        self.loop.call_later(self.stg_delay, self.publish_stg, device)
+
+    def on_set(self, topic: str, payload: bytes) -> None:
+        device = self.devices.get(self._mac(topic))
+        if device is None:
+            return
+        try:
+            frame = json_codec.loads(payload)
+        except json_codec.JSONDecodeError:
+            logging.warning(f"Simulator: invalid set frame on {topic}")
+            return
+        if frame.get("ptn") != "J00" or frame.get("code") != device.auth_code:
+            logging.warning(f"Simulator: rejected set frame for {device.mac}: {frame}")
+            return
+        device.apply(frame.get("enl") or [])
+        logging.info(f"Simulator: {device.mac} applied {frame.get('enl')}")
+        self.respond(device)
+
+    def on_subscribe(self, topic_filter: str) -> None:
+        device = self.devices.get(self._mac(topic_filter))
+        if device is not None:
+            self.respond(device)
+
+    def _push(self) -> None:
+        now = time.monotonic()
+        elapsed, self.last_tick = now - self.last_tick, now
+        for device in self.devices.values():
+            device.tick(elapsed)
+            self.publish_inf(device)
+            self.publish_stg(device)
+        self.loop.call_later(self.push_interval, self._push)
+
+    async def start(self, host: str, port: int) -> None:
+        self.loop = asyncio.get_running_loop()
+        await self.broker.start(host, port)
+        if self.push_interval > 0:
+            self.loop.call_later(self.push_interval, self._push)
@@ -0,0 +1,125 @@
+"""
+G56 设备状态机。operationMode 的代码按位组合:
+    0x02 采暖开启, 0x08 节能, 0x10 外出, 0x40 快速采暖 (例如 4B = 快速采暖/节能)
+模式开关的 J00 帧数据固定为 "31"，含义是切换对应的位。
+"""
+import random
+from typing import Any, Dict
+
+DEVICE_TYPE = "0F06000C"
+MODE_BITS = {
+    "energySavingMode": 0x08,
+    "outdoorMode": 0x10,
+    "rapidHeating": 0x40
+}
+TEMPERATURE_RANGES = {
+    "hotWaterTempSetting": (35, 60),
+    "heatingTempSettingNM": (45, 70),
+    "heatingTempSettingHES": (45, 70)
+}
+# 燃烧时每秒增加的 gasConsumption(0.0001 m³)，约 1.8 m³/h
+GAS_PER_SECOND = 5
+
+
+class SimulatedG56:
+    def __init__(self, mac: str, auth_code: str, device_id: int, seed: int = 0):
+        self.mac = mac
+        self.auth_code = auth_code
+        self.device_id = device_id
+        self.random = random.Random(seed)
+        self.state = {
+            "operationMode": "3",
+            "roomTempControl": "14",
+            "heatingOutWaterTempControl": "32",
+            "burningState": "30",
+            "hotWaterTempSetting": "2A",
+            "heatingTempSettingNM": "3C",
+            "heatingTempSettingHES": "37"
+        }
+        self.gas = 0x1E240
+        self.counters = {
+            "totalPowerSupplyTime": 0x1A2B,
+            "actualUseTime": 0x0F10,
+            "totalHeatingBurningTime": 0x0A00,
+            "heatingBurningTimes": 0x0123,
+            "hotWaterBurningTimes": 0x0456
+        }
+        self.elapsed = 0.0
+
+    def heating_on(self) -> bool:
+        # 休眠(2)带 0x02 位，但采暖并未开启
+        mode = int(self.state["operationMode"], 16)
+        return bool(mode & 0x02) and mode != 0x02
+
+    def apply(self, enl) -> bool:
+        """应用 J00 帧中的参数，返回状态是否变化"""
+        changed = False
+        for param in enl:
+            param_id, data = param.get("id"), param.get("data")
+            if param_id in TEMPERATURE_RANGES:
+                low, high = TEMPERATURE_RANGES[param_id]
+                value = max(low, min(high, int(data, 16)))
+                data = f"{value:02X}"
+                changed |= self.state[param_id] != data
+                self.state[param_id] = data
+            elif param_id in MODE_BITS or param_id == "summerWinter":
+                heating = self.heating_on()
+                mode = int(self.state["operationMode"], 16)
+                if param_id == "summerWinter":
+                    mode = 0x01 if heating else 0x03
+                elif heating:
+                    mode ^= MODE_BITS[param_id]
+                    if param_id == "energySavingMode":
+                        mode &= ~MODE_BITS["outdoorMode"]
+                    elif param_id == "outdoorMode":
+                        mode &= ~MODE_BITS["energySavingMode"]
+                self.state["operationMode"] = f"{mode:X}"
+                changed = True
+        return changed
+
+    def tick(self, seconds: float) -> None:
+        """推进模拟时间：采暖开启时间歇燃烧，偶尔烧热水"""
+        self.elapsed += seconds
+        burning = self.state["burningState"] != "30"
+        if burning:
+            self.gas += int(GAS_PER_SECOND * seconds)
+            self.counters["totalHeatingBurningTime"] += int(seconds // 3600)
+        roll = self.random.random()
+        if burning and roll < 0.3:
+            self.state["burningState"] = "30"
+        elif not burning and roll < 0.2:
+            if self.heating_on() and roll < 0.15:
+                self.state["burningState"] = "32"
+                self.counters["heatingBurningTimes"] += 1
+            else:
+                self.state["burningState"] = "31"
+                self.counters["hotWaterBurningTimes"] += 1
+
+    def inf_frame(self) -> Dict[str, Any]:
+        return {
+            "code": "FFFF",
+            "enl": [{"id": key, "data": value} for key, value in self.state.items()],
+            "id": DEVICE_TYPE,
+            "ptn": "J02",
+            "sum": str(len(self.state))
+        }
+
+    def stg_frame(self) -> Dict[str, Any]:
+        egy = {"gasConsumption": f"{self.gas:08X}"}
+        egy.update({key: f"{value:04X}" for key, value in self.counters.items()})
+        return {"code": "FFFF", "egy": [egy], "id": DEVICE_TYPE, "ptn": "J05"}
+
+    def device_record(self) -> Dict[str, Any]:
+        """设备列表接口中的一条记录"""
+        return {
+            "id": self.device_id,
+            "mac": self.mac,
+            "name": f"Simulated G56 {self.mac[-4:]}",
+            "authCode": self.auth_code,
+            "deviceType": DEVICE_TYPE,
+            "online": "1"
+        }
+
+    def process_parameters(self) -> Dict[str, str]:
+        return dict(self.state)
+
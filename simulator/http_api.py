@@ -0,0 +1,67 @@
+"""模拟 iot.rinnai.com.cn 的登录、设备列表和 processParameter 接口"""
+import json
+import time
+import uuid
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class RinnaiApiHandler(BaseHTTPRequestHandler):
+    server_version = "RinnaiSimulator/1.0"
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self) -> bool:
+        header = self.headers.get("Authorization", "")
+        return header.removeprefix("Bearer ") in self.server.tokens
+
+    def do_GET(self):
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        path = url.path.removeprefix(self.server.prefix)
+
+        if path == "/V1/login":
+            if not query.get("username") or not query.get("password"):
+                self._send_json({"success": False, "message": "用户名或密码错误"})
+                return
+            token = uuid.uuid4().hex
+            self.server.tokens.add(token)
+            self._send_json({"success": True, "data": {"token": token}})
+        elif not self._authorized():
+            self._send_json({"success": False, "message": "token 无效"})
+        elif path == "/V1/device/list":
+            devices = [device.device_record() for device in self.server.devices]
+            self._send_json({"success": True, "data": {"list": devices}})
+        elif path == "/V1/device/processParameter":
+            device = next((device for device in self.server.devices
+                           if str(device.device_id) == query.get("deviceId")), None)
+            if device is None:
+                self._send_json({"success": False, "message": "设备不存在"})
+            else:
+                self._send_json({"success": True, "data": device.process_parameters()})
+        else:
+            self.send_error(404)
+
+    def log_message(self, format, *args):
+        logging.debug(f"Simulator HTTP: {format % args}")
+
+
+def start_http_api(host, port, devices, delay=0.0, prefix="/app") -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), RinnaiApiHandler)
+    server.devices = devices
+    server.tokens = set()
+    server.delay = delay
+    server.prefix = prefix
+    threading.Thread(target=server.serve_forever, name="simulator-http", daemon=True).start()
+    logging.info(f"Simulator HTTP API on http://{host}:{port}{prefix}")
+    return server
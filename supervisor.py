@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from config import Config, DeviceConfig
+from clients.rinnai_client import RinnaiClient
+from clients.local_client import LocalClient
+from clients.local_connection import LocalConnection
+from clients.asyncio_helper import AsyncioMQTTHelper
+from clients.http_client import RinnaiHttpClient, create_session
+from clients.history_client import HistoryClient
+from clients.ha_discovery_client import RinnaiHomeAssistantDiscovery
+from processors.message_processor import MessageProcessor
+from processors.state_snapshot import StateSnapshot
+from processors.history_store import HistoryStore
+from utils import metrics
+from utils.scheduler import AsyncioScheduler
+from utils.startup import StartupTimer, ReadinessBarrier
+
+logger = logging.getLogger(__name__)
+
+
+class DeviceBridge:
+    """单台设备的桥接：独立的 RinnaiClient/MessageProcessor 状态，共享本地连接"""
+
+    def __init__(self, config, connection: LocalConnection):
+        self.config = config
+        self.message_processor = MessageProcessor(config.DEVICE_TYPE, config.RINNAI_DISPATCH_QUEUE)
+        snapshot_data = None
+        if config.RINNAI_STATE_SNAPSHOT:
+            self.snapshot = StateSnapshot(config.get_snapshot_path())
+            snapshot_data = self.snapshot.load()
+            self.message_processor.register_observer(self.snapshot)
+        if config.HISTORY_ENABLED:
+            self.history = HistoryStore(config.HISTORY_SIZES)
+            self.message_processor.register_observer(self.history)
+            self.history_client = HistoryClient(config, self.history, connection)
+        self.rinnai_client = RinnaiClient(config, self.message_processor)
+        self.local_client = LocalClient(config, self.rinnai_client, connection)
+        if snapshot_data:
+            # 先发布重启前的状态，标记为过期直到收到云端数据
+            self.message_processor.load_snapshot(snapshot_data)
+        # 自动发现配置在连接本地 broker 后与已保留的配置比较，只发布变化的部分
+        self.discovery = RinnaiHomeAssistantDiscovery(config, connection)
+
+    def connect_upstream(self):
+        if self.config.RINNAI_ON_DEMAND:
+            # 按需连接：定时连接获取更新，发送命令时临时连接
+            self.rinnai_client.schedule_update()
+        else:
+            # 常驻连接：持有一个不释放的租约
+            self.rinnai_client.leases.acquire()
+
+    def stop(self):
+        self.rinnai_client.stop()
+        if self.message_processor.dispatcher:
+            self.message_processor.dispatcher.stop()
+
+
+class Supervisor:
+    """
+    在一个进程内桥接所有账号下的设备。
+    未配置 RINNAI_ACCOUNTS/RINNAI_ALL_DEVICES 时只桥接第一台设备，主题保持原样。
+    """
+
+    STARTUP_WORKERS = 8
+
+    def __init__(self, config=Config):
+        self.config = config
+        self.connection = LocalConnection(config)
+        self.connection.on_ready = lambda: self.barrier.set("local")
+        self.bridges = []
+        self.helpers = []
+        self.stop_event = None
+        self.metrics_server = None
+        self.timing = StartupTimer()
+        self.barrier = ReadinessBarrier(["http", "local"], self.timing.report)
+
+    def _account_devices(self, http_client, multi_device):
+        if multi_device:
+            return http_client.get_all_devices()
+        device_info = http_client.get_devices()
+        return [device_info] if device_info else []
+
+    def _bootstrap_device(self, http_client, username, password, device_info, multi_device, connect):
+        """获取设备参数并创建桥接，connect 时同时建立林内连接"""
+        device_key = device_info.get("mac") if multi_device else None
+        name = device_info.get("mac")
+        device_config = DeviceConfig(
+            username, password, device_key, device_info.get("name"), base=self.config)
+        device_config.update_device_info(device_info)
+        logger.info(f"Current device info: {device_info}")
+
+        # 先创建桥接，磁盘快照中的状态不必等待 processParameter
+        bridge = self.timing.timed(
+            f"bridge_init[{name}]", DeviceBridge, device_config, self.connection)
+        self.bridges.append(bridge)
+
+        try:
+            init_status = self.timing.timed(
+                f"process_parameter[{name}]", http_client.get_process_parameter,
+                device_info.get("deviceId"), device_info.get("deviceType"))
+            device_config.update_init_status(init_status or {})
+            logger.info(f"Current device defalut info: {device_config.INIT_STATUS}")
+            # 本地连接可能已经建立，直接发布最新参数
+            bridge.rinnai_client.set_default_status()
+            if connect:
+                self.timing.timed(f"rinnai_connect[{name}]", bridge.connect_upstream)
+        except Exception:
+            # 引导失败的设备不计入已桥接的设备
+            self.bridges.remove(bridge)
+            bridge.stop()
+            raise
+        return bridge
+
+    def setup(self, pool: ThreadPoolExecutor, connect=True) -> bool:
+        """登录所有账号并为每台在线设备并行创建桥接，至少有一台设备时返回 True"""
+        multi_device = self.config.is_multi_device()
+        # 所有账号共用一个 HTTP 连接池
+        session = create_session()
+        futures = []
+        for username, password in self.config.get_accounts():
+            http_client = RinnaiHttpClient(
+                DeviceConfig(username, password, base=self.config), session)
+            try:
+                self.timing.timed(f"authenticate[{username}]", http_client.authenticate)
+                devices = self.timing.timed(
+                    f"device_list[{username}]", self._account_devices, http_client, multi_device)
+            except ConnectionError as e:
+                logger.error(f"Rinnai account {username} login failed: {e}")
+                continue
+
+            for device_info in devices:
+                futures.append((device_info.get("mac"), pool.submit(
+                    self._bootstrap_device, http_client, username, password,
+                    device_info, multi_device, connect)))
+
+        # 单台设备失败不影响其他设备
+        for name, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Rinnai device {name} bootstrap failed: {e}")
+
+        logger.info(f"Bridging {len(self.bridges)} Rinnai device(s)")
+        return bool(self.bridges)
+
+    def connect_local(self):
+        self.connection.connect(self.config.LOCAL_MQTT_HOST, self.config.LOCAL_MQTT_PORT)
+
+    def startup(self, connect=True) -> bool:
+        """
+        并行启动：本地 broker 连接与 HTTP 引导同时进行，每台设备的参数获取、
+        桥接创建和林内连接也并行执行。本地连接和 HTTP 引导都就绪后输出耗时报告。
+        connect=False 时只做 HTTP 引导，连接留给 asyncio 运行时。
+        """
+        if self.config.METRICS_PORT:
+            self.metrics_server = metrics.start_server(self.config.METRICS_HOST, self.config.METRICS_PORT)
+        with ThreadPoolExecutor(max_workers=self.STARTUP_WORKERS) as pool:
+            local_future = pool.submit(
+                self.timing.timed, "local_connect", self.connect_local) if connect else None
+            ready = self.timing.timed("http_bootstrap", self.setup, pool, connect)
+            if local_future:
+                local_future.result()
+        if ready:
+            self.barrier.set("http")
+        return ready
+
+    def start(self):
+        """建立所有连接，startup(connect=False) 之后由 asyncio 运行时调用"""
+        for bridge in self.bridges:
+            self.timing.timed(f"rinnai_connect[{bridge.config.DEVICE_SN}]", bridge.connect_upstream)
+        self.timing.timed("local_connect", self.connect_local)
+
+    def run_forever(self):
+        # 共享的本地连接在主线程运行
+        self.connection.client.loop_forever()
+
+    async def run_async(self):
+        """
+        单线程 asyncio 运行：所有 MQTT 客户端通过 socket 回调由事件循环驱动，
+        定时器改为事件循环上的任务，不再启动 paho 的网络线程。
+        """
+        loop = asyncio.get_running_loop()
+        scheduler = AsyncioScheduler(loop)
+        self.helpers = [AsyncioMQTTHelper(loop, self.connection.client)]
+        for bridge in self.bridges:
+            bridge.rinnai_client.scheduler = scheduler
+            bridge.rinnai_client.use_loop_thread = False
+            if bridge.message_processor.dispatcher:
+                bridge.message_processor.dispatcher.use_loop(loop)
+            leases = bridge.rinnai_client.leases
+            # 没有租约时(例如连接被拒绝后)不再自动重连
+            bridge.rinnai_client.helper = AsyncioMQTTHelper(
+                loop, bridge.rinnai_client.client, should_reconnect=lambda leases=leases: leases.leases > 0)
+            self.helpers.append(bridge.rinnai_client.helper)
+
+        self.stop_event = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.request_stop)
+            except NotImplementedError:
+                # Windows 的事件循环不支持信号处理，仍由 KeyboardInterrupt 退出
+                pass
+        try:
+            self.start()
+            await self.stop_event.wait()
+        finally:
+            # 在事件循环关闭前断开连接，断开时仍需要写 socket
+            self.stop()
+            for helper in self.helpers:
+                helper.close()
+
+    def request_stop(self):
+        """SIGINT/SIGTERM 时结束 run_async，断开所有连接后退出"""
+        if self.stop_event:
+            self.stop_event.set()
+
+    def stop(self):
+        for bridge in self.bridges:
+            bridge.stop()
+        self.connection.stop()
+        if self.metrics_server:
+            self.metrics_server.shutdown()
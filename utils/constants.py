@@ -1,3 +1,5 @@
+import os
+
 # MQTT Topics
 TOPIC_TYPES = {
     "DEVICE_INFO": "inf",
@@ -49,9 +51,11 @@ STATE_PARAMETERS = {
 }
 
 
-HOST = "https://iot.rinnai.com.cn/app"
+# 可指向本地模拟器，例如 http://127.0.0.1:8080/app
+HOST = os.getenv('RINNAI_HTTP_HOST', "https://iot.rinnai.com.cn/app")
 LOGIN_URL = f"{HOST}/V1/login"
 INFO_URL = f"{HOST}/V1/device/list"
 PROCESS_PARAMETER_URL = f"{HOST}/V1/device/processParameter"
+HTTP_TIMEOUT = 10
 # 林内智家app内置accessKey
 AK = "A39C66706B83CCF0C0EE3CB23A39454D" 
\ No newline at end of file
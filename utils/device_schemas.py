@@ -0,0 +1,39 @@
+"""
+各型号设备的参数定义。
+新增型号时在 DEVICE_SCHEMAS 中添加一份 schema 即可，解码逻辑无需修改。
+
+参数类型:
+    hex:    十六进制整数，转换为十进制字符串
+    enum:   查表转换，table 为 代码 -> 名称
+    scaled: 十六进制整数乘以 scale 后的值，digits 为保留的小数位
+inf 参数写入 state，stg(egy) 参数写入 section 指定的分组(gas/supplyTime)。
+"""
+import utils.constants as const
+
+G56_SCHEMA = {
+    "model": "G56",
+    "inf": {
+        "operationMode": {"type": "enum", "table": const.OPERATION_MODES},
+        "roomTempControl": {"type": "hex"},
+        "heatingOutWaterTempControl": {"type": "hex"},
+        "burningState": {"type": "enum", "table": const.BURNING_STATES},
+        "hotWaterTempSetting": {"type": "hex"},
+        "heatingTempSettingNM": {"type": "hex"},
+        "heatingTempSettingHES": {"type": "hex"}
+    },
+    "stg": {
+        "gasConsumption": {"type": "hex", "section": "gas"},
+        **{key: {"type": "hex", "section": "supplyTime"} for key in const.TIME_PARAMETERS}
+    }
+}
+
+DEVICE_SCHEMAS = {
+    "0F06000C": G56_SCHEMA
+}
+
+# 未知型号按 G56 处理，与之前的行为一致
+DEFAULT_SCHEMA = G56_SCHEMA
+
+
+def get_schema(device_type):
+    return DEVICE_SCHEMAS.get(device_type, DEFAULT_SCHEMA)
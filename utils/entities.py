@@ -0,0 +1,111 @@
+"""
+Home Assistant 实体、本地命令主题和模式开关的统一定义。
+自动发现配置、本地主题到处理函数的分发、开关状态判断都由 ENTITIES 派生，
+新增实体时只需在这里添加一项。
+
+字段:
+    kind:      sensor / number / switch / binary_sensor / select
+    object_id: 实体 id，决定 unique_id 和发现主题，已有实体不要修改
+    param:     林内参数 id，默认取 object_id 最后一段
+    section:   数据所在的分组(state/gas/supplyTime/metrics)，对应同名的本地状态主题，默认 state
+    state:     不在分组中的实体使用的本地主题名
+    command:   本地命令主题(相对于主题前缀)
+    modes:     开关为开时 operationMode 的取值；inverted 为 True 时取值在其中表示关
+    bit:       开关在 operationMode 代码中对应的位，用于推算切换后的模式
+"""
+import utils.constants as const
+
+# gasConsumption 的单位是 0.0001 m³
+GAS_SCALE = 10000
+
+ENTITIES = (
+    # 传感器
+    # {"kind": "sensor", "object_id": "roomTempControl", "label": "室温控制", "section": "state", "unit": "°C"},
+    # {"kind": "sensor", "object_id": "heatingOutWaterTempControl", "label": "出水温度", "section": "state", "unit": "°C"},
+    {"kind": "sensor", "object_id": "operationMode", "label": "模式", "section": "state"},
+    {"kind": "sensor", "object_id": "burningState", "label": "燃烧状态", "section": "state"},
+    {"kind": "sensor", "object_id": "hotWaterTempSetting", "label": "热水温度", "section": "state", "unit": "°C"},
+    {"kind": "sensor", "object_id": "heatingTempSettingNM", "label": "锅炉温度", "section": "state", "unit": "°C"},
+    {"kind": "sensor", "object_id": "heatingTempSettingHES", "label": "锅炉温度/节能", "section": "state", "unit": "°C"},
+    {"kind": "sensor", "object_id": "gasConsumption", "label": "耗气量", "section": "gas", "unit": "m³",
+     "scale": GAS_SCALE, "device_class": "gas"},
+    {"kind": "sensor", "object_id": "supplyTime/totalPowerSupplyTime", "label": "供电时间", "section": "supplyTime", "unit": "h"},
+    {"kind": "sensor", "object_id": "supplyTime/actualUseTime", "label": "使用时间", "section": "supplyTime", "unit": "h"},
+    {"kind": "sensor", "object_id": "supplyTime/totalHeatingBurningTime", "label": "燃烧时间", "section": "supplyTime", "unit": "h"},
+    {"kind": "sensor", "object_id": "supplyTime/heatingBurningTimes", "label": "地暖燃烧次数", "section": "supplyTime", "unit": "次"},
+    {"kind": "sensor", "object_id": "supplyTime/hotWaterBurningTimes", "label": "热水燃烧次数", "section": "supplyTime", "unit": "次"},
+    {"kind": "sensor", "object_id": "metrics/gasFlowRate", "label": "燃气流量", "section": "metrics", "unit": "m³/h"},
+    {"kind": "sensor", "object_id": "metrics/dutyCycle1h", "label": "燃烧占空比/1小时", "section": "metrics", "unit": "%"},
+    {"kind": "sensor", "object_id": "metrics/dutyCycle24h", "label": "燃烧占空比/24小时", "section": "metrics", "unit": "%"},
+    {"kind": "sensor", "object_id": "metrics/burnSessions", "label": "燃烧次数", "section": "metrics", "unit": "次"},
+    {"kind": "sensor", "object_id": "metrics/lastBurnDuration", "label": "上次燃烧时长", "section": "metrics", "unit": "min"},
+    {"kind": "sensor", "object_id": "metrics/lastBurnGas", "label": "上次燃烧耗气量", "section": "metrics", "unit": "m³"},
+    # 温度控制
+    {"kind": "number", "object_id": "hotWaterTempSetting", "label": "热水温度", "section": "state",
+     "command": "set/temp/hotWaterTempSetting", "min": 35, "max": 60, "unit": "°C"},
+    {"kind": "number", "object_id": "heatingTempSettingNM", "label": "锅炉温度", "section": "state",
+     "command": "set/temp/heatingTempSettingNM", "min": 45, "max": 70, "unit": "°C"},
+    {"kind": "number", "object_id": "heatingTempSettingHES", "label": "锅炉温度/节能", "section": "state",
+     "command": "set/temp/heatingTempSettingHES", "min": 45, "max": 70, "unit": "°C"},
+    # 模式控制
+    {"kind": "switch", "object_id": "energySavingMode", "label": "节能模式", "command": "set/mode/energySavingMode",
+     "modes": ("采暖节能", "快速采暖/节能"), "bit": 0x08},
+    {"kind": "switch", "object_id": "outdoorMode", "label": "外出模式", "command": "set/mode/outdoorMode",
+     "modes": ("采暖外出", "快速采暖/外出"), "bit": 0x10},
+    {"kind": "switch", "object_id": "rapidHeating", "label": "快速采暖", "command": "set/mode/rapidHeating",
+     "modes": ("快速采暖", "快速采暖/节能", "快速采暖/外出", "快速采暖/预约"), "bit": 0x40},
+    {"kind": "switch", "object_id": "summerWinter", "label": "采暖开关", "command": "set/mode/summerWinter",
+     "modes": ("关机", "采暖关闭", "休眠"), "inverted": True},
+    # 状态来自重启前的快照、尚未收到云端数据
+    {"kind": "binary_sensor", "object_id": "stale", "label": "数据过期", "state": "stale", "device_class": "problem"},
+    # 场景预设，配置了预设时才发布
+    {"kind": "select", "object_id": "preset", "label": "场景", "command": "set/preset", "state": "presetState"},
+)
+
+
+def _compile(entity):
+    entity = dict(entity)
+    entity.setdefault("param", entity["object_id"].split("/")[-1])
+    if "modes" in entity:
+        entity.setdefault("inverted", False)
+    return entity
+
+
+ENTITIES = tuple(_compile(entity) for entity in ENTITIES)
+# 模式开关和温度参数，按参数 id 查找
+SWITCHES = {entity["param"]: entity for entity in ENTITIES if entity["kind"] == "switch"}
+TEMPERATURES = {entity["param"]: entity for entity in ENTITIES if entity["kind"] == "number"}
+# 桥接端换算后发布的属性(LOCAL_ATTRIBUTE_TOPICS)
+SCALES = {entity["param"]: entity["scale"] for entity in ENTITIES if "scale" in entity}
+# 每种 operationMode 下各开关的状态，启动时算好
+_SWITCH_TABLE = {
+    mode: {name: (mode in switch["modes"]) != switch["inverted"] for name, switch in SWITCHES.items()}
+    for mode in const.OPERATION_MODES.values()
+}
+
+
+def switch_status(switch: str, operation_mode) -> bool:
+    """operationMode 下开关是否为开"""
+    statuses = _SWITCH_TABLE.get(operation_mode)
+    if statuses is not None:
+        return statuses.get(switch, False)
+    entity = SWITCHES.get(switch)
+    return entity is not None and entity["inverted"]
+
+
+def switch_statuses(operation_mode) -> dict:
+    """operationMode 下所有开关的状态 {开关: bool}"""
+    statuses = _SWITCH_TABLE.get(operation_mode)
+    if statuses is None:
+        statuses = {name: switch_status(name, operation_mode) for name in SWITCHES}
+    return statuses
+
+
+def command_topics(prefix: str) -> dict:
+    """{参数 id: 本地命令主题}"""
+    return {entity["param"]: f"{prefix}/{entity['command']}" for entity in ENTITIES if "command" in entity}
+
+
+def command_routes(prefix: str) -> dict:
+    """{本地命令主题: 实体}，每个本地客户端编译一次，收到消息时按主题直接查找"""
+    return {f"{prefix}/{entity['command']}": entity for entity in ENTITIES if "command" in entity}
@@ -0,0 +1,89 @@
+"""
+林内上行帧的二进制记录。文件以 MAGIC 开头，之后每条记录为
+    <d 时间戳><H 主题长度><I payload 长度><主题><payload>
+超过 max_bytes 时像 RotatingFileHandler 一样轮转为 .1 .2 ...
+"""
+import os
+import struct
+import logging
+import threading
+from typing import Iterator, Tuple
+
+MAGIC = b"RNFL1\n"
+RECORD_HEADER = struct.Struct("<dHI")
+
+
+class FrameLogWriter:
+    def __init__(self, path: str, max_bytes: int = 16 * 1024 * 1024, backups: int = 5):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.lock = threading.Lock()
+        self.file = None
+        self.size = 0
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(self.path, "ab")
+        self.size = self.file.tell()
+        if self.size == 0:
+            self.file.write(MAGIC)
+            self.size = len(MAGIC)
+
+    def _rotate(self):
+        self.file.close()
+        self.file = None
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def write(self, timestamp: float, topic: str, payload: bytes) -> None:
+        topic_bytes = topic.encode("utf-8")
+        record = RECORD_HEADER.pack(timestamp, len(topic_bytes), len(payload)) + topic_bytes + payload
+        with self.lock:
+            try:
+                if self.file is None:
+                    self._open()
+                if self.max_bytes and self.size + len(record) > self.max_bytes and self.size > len(MAGIC):
+                    self._rotate()
+                    self._open()
+                self.file.write(record)
+                self.file.flush()
+                self.size += len(record)
+            except OSError as e:
+                logging.warning(f"Failed to write frame capture {self.path}: {e}")
+
+    def close(self) -> None:
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+def read_frames(path: str) -> Iterator[Tuple[float, str, bytes]]:
+    """依次返回 (时间戳, 主题, payload)，忽略进程退出时写了一半的最后一条记录"""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a frame capture file")
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            timestamp, topic_length, payload_length = RECORD_HEADER.unpack(header)
+            body = f.read(topic_length + payload_length)
+            if len(body) < topic_length + payload_length:
+                logging.warning(f"Truncated record at the end of {path}")
+                return
+            yield timestamp, body[:topic_length].decode("utf-8"), body[topic_length:]
+
+
+def is_frame_log(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
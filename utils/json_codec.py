@@ -0,0 +1,29 @@
+"""
+JSON 编解码。安装了 orjson 时使用 orjson，否则回落到标准库 json。
+loads 直接接受 bytes，dumps 返回 str 且保留中文字符。
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 取决于运行环境
+    orjson = None
+
+JSONDecodeError = json.JSONDecodeError
+
+if orjson is not None:
+    BACKEND = "orjson"
+
+    def loads(data):
+        return orjson.loads(data)
+
+    def dumps(obj) -> str:
+        return orjson.dumps(obj).decode('utf-8')
+else:
+    BACKEND = "json"
+
+    def loads(data):
+        return json.loads(data)
+
+    def dumps(obj) -> str:
+        return json.dumps(obj, ensure_ascii=False)
@@ -0,0 +1,112 @@
+"""
+日志初始化。记录在调用线程中只做过滤和入队，格式化和输出由后台线程完成，不占用 paho 网络线程。
+
+每帧、每次发布的热路径日志使用 %s 延迟格式化，并传入 extra=SAMPLED:
+    logging.info("Published state to local MQTT: %s", state_data, extra=log.SAMPLED)
+- 同一调用位置的 SAMPLED 日志每 LOG_SAMPLE_EVERY 条输出一条
+- 每个调用位置每秒最多输出 LOG_RATE_LIMIT 条 INFO/DEBUG 日志，WARNING 及以上不受限制
+被跳过的条数附在该调用位置下一条输出的日志后面。
+日志参数在后台线程中才格式化，传入的对象在记录后不应再被修改。
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
+
+FORMAT = "%(levelname)s:%(name)s:%(message)s"
+# 热路径日志调用传入 extra=SAMPLED
+SAMPLED = {"sampled": True}
+
+_listener = None
+
+
+class _CallSite:
+    __slots__ = ("seen", "window_start", "window_count", "suppressed")
+
+    def __init__(self, now: float):
+        self.seen = 0
+        self.window_start = now
+        self.window_count = 0
+        self.suppressed = 0
+
+
+class CallSiteFilter(logging.Filter):
+    """按调用位置(文件, 行号)采样和限速"""
+
+    def __init__(self, sample_every: int = 1, rate_limit: float = 0):
+        super().__init__()
+        self.sample_every = max(1, sample_every)
+        self.rate_limit = rate_limit
+        self.sites = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        sampled = self.sample_every > 1 and getattr(record, "sampled", False)
+        if not sampled and self.rate_limit <= 0:
+            return True
+        key = (record.pathname, record.lineno)
+        now = record.created
+        with self.lock:
+            site = self.sites.get(key)
+            if site is None:
+                site = self.sites[key] = _CallSite(now)
+            site.seen += 1
+            drop = sampled and (site.seen - 1) % self.sample_every != 0
+            if not drop and self.rate_limit > 0:
+                if now - site.window_start >= 1:
+                    site.window_start = now
+                    site.window_count = 0
+                drop = site.window_count >= self.rate_limit
+                if not drop:
+                    site.window_count += 1
+            if drop:
+                site.suppressed += 1
+                return False
+            suppressed, site.suppressed = site.suppressed, 0
+        if suppressed:
+            record.msg = f"{record.msg} [{suppressed} similar suppressed]"
+        return True
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """默认的 prepare 会在调用线程中格式化消息，这里原样入队，由监听线程格式化"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup(config, stream=None) -> None:
+    """
+    配置根日志。LOGGING 为 False 时只输出警告和错误，
+    INFO 日志在调用处就被级别判断挡掉，参数不会被格式化。
+    """
+    global _listener
+    shutdown()
+    root = logging.getLogger()
+    root.setLevel(logging.INFO if config.LOGGING else logging.WARNING)
+
+    output = logging.StreamHandler(stream)
+    output.setFormatter(logging.Formatter(FORMAT))
+    records = queue.SimpleQueue()
+    handler = DeferredQueueHandler(records)
+    handler.addFilter(CallSiteFilter(config.LOG_SAMPLE_EVERY, config.LOG_RATE_LIMIT))
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+
+    _listener = logging.handlers.QueueListener(records, output)
+    _listener.start()
+
+
+def shutdown() -> None:
+    """输出队列中剩余的日志并停止后台线程"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown)
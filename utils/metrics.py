@@ -0,0 +1,129 @@
+"""
+Prometheus 文本格式的运行指标，只依赖标准库。
+未调用 start_server 时 ENABLED 为 False，埋点处先判断 ENABLED，
+关闭时只多一次属性读取。
+"""
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ENABLED = False
+
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = labels
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for labels, value in self.values.items():
+                lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = labels
+        self.buckets = tuple(buckets)
+        # labels -> [各桶计数(不累计), 总和, 次数]
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for labels, (counts, total, count) in self.values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    bucket_labels = _format_labels(self.label_names, labels, f'le="{le}"')
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                label_text = _format_labels(self.label_names, labels)
+                lines.append(f"{self.name}_sum{label_text} {total}")
+                lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+FRAMES = Counter("rinnai_frames_total", "Frames received from the Rinnai broker", ("kind",))
+DECODE_SECONDS = Histogram("rinnai_decode_seconds", "Time spent decoding a frame", ("kind",))
+FANOUT_SECONDS = Histogram("rinnai_observer_fanout_seconds", "Time spent notifying all observers")
+LOCAL_PUBLISHES = Counter("rinnai_local_publish_total", "Messages published to the local broker", ("section",))
+LOCAL_PUBLISH_BYTES = Counter("rinnai_local_publish_bytes_total", "Payload bytes published to the local broker",
+                              ("section",))
+UPSTREAM_CONNECTS = Counter("rinnai_upstream_connect_total", "Connection results from the Rinnai broker", ("rc",))
+COMMAND_ACK_SECONDS = Histogram("rinnai_command_ack_seconds",
+                                "Time from sending a command to the device reporting the new value",
+                                ("param",), buckets=LATENCY_BUCKETS)
+COMMAND_TIMEOUTS = Counter("rinnai_command_timeouts_total", "Commands rolled back after a timeout", ("param",))
+DISPATCH_COALESCED = Counter("rinnai_dispatch_coalesced_total",
+                             "Updates merged into a pending dispatch because observers were busy")
+
+REGISTRY = (FRAMES, DECODE_SECONDS, FANOUT_SECONDS, LOCAL_PUBLISHES, LOCAL_PUBLISH_BYTES,
+            UPSTREAM_CONNECTS, COMMAND_ACK_SECONDS, COMMAND_TIMEOUTS,
+            DISPATCH_COALESCED)
+
+
+def expose() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.expose())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = expose().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug("Metrics request: " + format, *args)
+
+
+def start_server(host, port) -> ThreadingHTTPServer:
+    """在后台线程中提供 /metrics，并打开埋点"""
+    global ENABLED
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    ENABLED = True
+    logging.info(f"Metrics endpoint listening on http://{host}:{port}/metrics")
+    return server
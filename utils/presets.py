@@ -0,0 +1,73 @@
+"""
+场景预设。预设文件为 JSON，键为场景名，值为要设置的参数:
+
+    {
+        "home": {"outdoorMode": "OFF", "hotWaterTempSetting": 45, "heatingTempSettingNM": 60},
+        "away": {"outdoorMode": "ON", "hotWaterTempSetting": 38}
+    }
+
+温度参数填写摄氏度整数，且在实体的 min/max 范围内，模式开关填写 ON/OFF。
+无效的设置记录警告后跳过，不影响其他设置和场景。
+"""
+import json
+import logging
+import os
+from utils.entities import SWITCHES, TEMPERATURES
+
+TEMPERATURE_PARAMETERS = set(TEMPERATURES)
+MODE_PARAMETERS = set(SWITCHES)
+
+
+def parse_temperature(param_id, value):
+    """返回范围内的整数温度，无效时返回 None"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if isinstance(value, bool) or not number.is_integer():
+        return None
+    entity = TEMPERATURES[param_id]
+    if not entity["min"] <= number <= entity["max"]:
+        return None
+    return int(number)
+
+
+def load_presets(path):
+    """读取并校验预设文件，文件不存在或无法解析时返回空字典"""
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            raw = json.load(f)
+    except (OSError, ValueError) as e:
+        logging.error(f"Failed to read presets file {path}: {e}")
+        return {}
+    if not isinstance(raw, dict):
+        logging.error(f"Presets file {path} must contain a JSON object")
+        return {}
+
+    presets = {}
+    for name, settings in raw.items():
+        if not isinstance(settings, dict):
+            logging.warning(f"Ignoring preset {name}: settings must be an object")
+            continue
+        preset = {}
+        for param_id, value in settings.items():
+            if param_id in TEMPERATURE_PARAMETERS:
+                temperature = parse_temperature(param_id, value)
+                if temperature is None:
+                    entity = TEMPERATURES[param_id]
+                    logging.warning(f"Ignoring invalid preset temperature {name}.{param_id}: {value} "
+                                    f"(expected an integer between {entity['min']} and {entity['max']})")
+                    continue
+                preset[param_id] = temperature
+            elif param_id in MODE_PARAMETERS and str(value).upper() in ("ON", "OFF"):
+                preset[param_id] = str(value).upper()
+            else:
+                logging.warning(f"Ignoring unsupported preset setting {name}.{param_id}: {value}")
+        if not preset:
+            logging.warning(f"Ignoring preset {name}: no valid settings")
+            continue
+        presets[name] = preset
+    logging.info(f"Loaded presets: {list(presets)}")
+    return presets
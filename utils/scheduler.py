@@ -0,0 +1,24 @@
+"""
+延时任务调度。RinnaiClient 等通过 scheduler.call_later 安排定时任务，
+返回的句柄都支持 cancel()，因此线程模式和 asyncio 模式可以互换。
+"""
+import threading
+
+
+class ThreadScheduler:
+    """默认实现，每个任务一个 threading.Timer"""
+
+    def call_later(self, delay, callback, *args):
+        timer = threading.Timer(delay, callback, args)
+        timer.start()
+        return timer
+
+
+class AsyncioScheduler:
+    """asyncio 实现，任务在事件循环线程上执行"""
+
+    def __init__(self, loop):
+        self.loop = loop
+
+    def call_later(self, delay, callback, *args):
+        return self.loop.call_later(delay, callback, *args)
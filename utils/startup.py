@@ -0,0 +1,58 @@
+import time
+import logging
+import threading
+
+
+class StartupTimer:
+    """记录启动各阶段的耗时，阶段可以在不同线程中并行执行"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.phases = []
+        self.lock = threading.Lock()
+
+    def timed(self, name, func, *args, **kwargs):
+        """执行 func 并记录为一个阶段"""
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.record(name, start)
+
+    def record(self, name, start=None):
+        end = time.perf_counter()
+        start = self.started_at if start is None else start
+        with self.lock:
+            self.phases.append((name, start - self.started_at, end - start))
+
+    def report(self):
+        with self.lock:
+            phases = sorted(self.phases, key=lambda phase: phase[1])
+        lines = [f"  {name:<32} +{offset:7.3f}s  {duration:7.3f}s" for name, offset, duration in phases]
+        total = time.perf_counter() - self.started_at
+        logging.info("Startup timing report (phase, start offset, duration):\n"
+                     + "\n".join(lines) + f"\n  ready after {total:.3f}s")
+
+
+class ReadinessBarrier:
+    """所有阶段都标记完成后调用一次 on_ready，阶段可以在任意线程中标记"""
+
+    def __init__(self, names, on_ready=None):
+        self.pending = set(names)
+        self.on_ready = on_ready
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+
+    def set(self, name):
+        with self.lock:
+            if self.event.is_set() or name not in self.pending:
+                return
+            self.pending.discard(name)
+            if self.pending:
+                return
+            self.event.set()
+        if self.on_ready:
+            self.on_ready()
+
+    def wait(self, timeout=None) -> bool:
+        return self.event.wait(timeout)
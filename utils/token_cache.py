@@ -0,0 +1,54 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from utils.atomic_file import write_json_atomic
+
+
+class TokenCache:
+    """
+    登录 token 的磁盘缓存，每个账号一个文件。
+    缓存键包含密码 hash，修改密码后缓存自动失效。
+    """
+
+    def __init__(self, cache_dir, username, password_hash, ttl):
+        key = hashlib.md5(f"{username}:{password_hash}".encode('utf-8')).hexdigest()[:16]
+        self.path = os.path.join(cache_dir, f"token_{key}.json") if cache_dir else None
+        self.ttl = ttl
+
+    @property
+    def enabled(self):
+        return bool(self.path) and self.ttl > 0
+
+    def load(self):
+        """返回未过期的缓存内容，没有或已过期时返回 None"""
+        if not self.enabled or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Failed to read token cache {self.path}: {e}")
+            return None
+        if not data.get("token") or time.time() - data.get("saved_at", 0) > self.ttl:
+            return None
+        return data
+
+    def save(self, **fields):
+        """合并写入缓存字段；更新 token 时重新计算过期时间"""
+        if not self.enabled:
+            return
+        data = (self.load() or {}) if "token" not in fields else {"saved_at": time.time()}
+        data.update(fields)
+        try:
+            write_json_atomic(self.path, data, mode=0o600)
+        except OSError as e:
+            logging.warning(f"Failed to write token cache {self.path}: {e}")
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            try:
+                os.remove(self.path)
+            except OSError as e:
+                logging.warning(f"Failed to remove token cache {self.path}: {e}")